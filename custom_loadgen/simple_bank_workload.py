@@ -5,29 +5,106 @@ A Python alternative to 'cockroach workload' command for generating bank-like lo
 """
 
 import psycopg2
+import psycopg2.extras
 import argparse
+import bisect
+import gzip
+import json
+import queue
+import re
+import socket
 import time
 import threading
 import random
 import sys
+import uuid
 from datetime import datetime
 from collections import defaultdict
 
+# Upper bounds (ms) of the latency histogram buckets, 25% apart from 0.5ms to ~4.5min.
+# Fixed bounds keep histograms from different workers and hosts mergeable.
+LATENCY_BOUNDS_MS = tuple(0.5 * 1.25 ** i for i in range(60))
+
 class BankWorkloadStats:
     """Track workload statistics"""
     def __init__(self):
         self.lock = threading.Lock()
         self.operations = defaultdict(int)
         self.errors = defaultdict(int)
+        self.latency = defaultdict(lambda: [0] * (len(LATENCY_BOUNDS_MS) + 1))
+        # Keys fetched by successful multi-key operations, for per-key figures
+        self.keys = defaultdict(int)
         self.start_time = time.time()
     
-    def record_operation(self, op_type, success=True):
+    def record_operation(self, op_type, success=True, latency=None, keys=None):
         with self.lock:
             if success:
                 self.operations[op_type] += 1
+                if keys is not None:
+                    self.keys[op_type] += keys
+                if latency is not None:
+                    self.latency[op_type][bisect.bisect_left(LATENCY_BOUNDS_MS, latency * 1000)] += 1
             else:
                 self.errors[op_type] += 1
     
+    def snapshot(self):
+        """JSON-serializable copy of the counters, see merge_snapshots"""
+        with self.lock:
+            return {
+                'elapsed_time': time.time() - self.start_time,
+                'operations': dict(self.operations),
+                'errors': dict(self.errors),
+                'latency': {op_type: list(counts) for op_type, counts in self.latency.items()},
+                'keys': dict(self.keys)
+            }
+    
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        stats = cls()
+        stats.start_time = time.time() - snapshot['elapsed_time']
+        stats.operations.update(snapshot['operations'])
+        stats.errors.update(snapshot['errors'])
+        stats.keys.update(snapshot['keys'])
+        for op_type, counts in snapshot['latency'].items():
+            stats.latency[op_type] = list(counts)
+        return stats
+    
+    @staticmethod
+    def merge_snapshots(snapshots):
+        """Combine snapshots taken by workloads running side by side"""
+        merged = {'elapsed_time': 0.0, 'operations': defaultdict(int),
+                  'errors': defaultdict(int), 'latency': {}, 'keys': defaultdict(int)}
+        for snapshot in snapshots:
+            merged['elapsed_time'] = max(merged['elapsed_time'], snapshot['elapsed_time'])
+            for op_type, count in snapshot['operations'].items():
+                merged['operations'][op_type] += count
+            for op_type, count in snapshot['errors'].items():
+                merged['errors'][op_type] += count
+            for op_type, counts in snapshot['latency'].items():
+                totals = merged['latency'].setdefault(op_type, [0] * len(counts))
+                for i, count in enumerate(counts):
+                    totals[i] += count
+            for op_type, count in snapshot['keys'].items():
+                merged['keys'][op_type] += count
+        merged['operations'] = dict(merged['operations'])
+        merged['errors'] = dict(merged['errors'])
+        merged['keys'] = dict(merged['keys'])
+        return merged
+    
+    @staticmethod
+    def percentile(counts, fraction):
+        """Upper bound (ms) of the histogram bucket holding the given fraction"""
+        total = sum(counts)
+        if total == 0:
+            return 0.0
+        target = fraction * total
+        seen = 0
+        for i, count in enumerate(counts):
+            seen += count
+            if seen >= target:
+                return LATENCY_BOUNDS_MS[i] if i < len(LATENCY_BOUNDS_MS) else float('inf')
+        return float('inf')
+    
     def get_stats(self):
         with self.lock:
             elapsed = time.time() - self.start_time
@@ -40,19 +117,159 @@ class BankWorkloadStats:
                 'total_errors': total_errors,
                 'ops_per_second': total_ops / elapsed if elapsed > 0 else 0,
                 'operations_breakdown': dict(self.operations),
-                'errors_breakdown': dict(self.errors)
+                'errors_breakdown': dict(self.errors),
+                'keys_breakdown': dict(self.keys),
+                'latency_breakdown': {
+                    op_type: {
+                        'p50': self.percentile(counts, 0.50),
+                        'p95': self.percentile(counts, 0.95),
+                        'p99': self.percentile(counts, 0.99)
+                    }
+                    for op_type, counts in self.latency.items()
+                }
             }
 
+def parse_read_staleness(value):
+    """Turn --read-staleness into (mode, AS OF SYSTEM TIME expression or None)
+    
+    exact          strongly consistent read served by the leaseholder
+    follower       AS OF SYSTEM TIME follower_read_timestamp()
+    bounded:<dur>  AS OF SYSTEM TIME with_max_staleness('<dur>'), e.g. bounded:10s
+    """
+    if value == 'exact':
+        return ('exact', None)
+    if value == 'follower':
+        return ('follower', 'follower_read_timestamp()')
+    match = re.fullmatch(r'bounded:(\d+(?:\.\d+)?(?:ms|s|m|h))', value)
+    if match:
+        return ('bounded', f"with_max_staleness('{match.group(1)}')")
+    raise argparse.ArgumentTypeError(
+        f"invalid read staleness {value!r} (use exact, follower or bounded:<duration> like bounded:10s)")
+
+# Primary key layouts for accounts; all but 'sequential' spread inserts over ranges
+KEY_SCHEMES = ('sequential', 'uuid', 'hash-sharded', 'bit-reversed')
+
+# Namespace for the deterministic UUIDs used by the 'uuid' key scheme
+ACCOUNT_UUID_NAMESPACE = uuid.UUID('6f1c1f4e-3b7a-4d59-9a2e-0c6d2f8b7a10')
+
+def bit_reverse(value, bits=63):
+    """Reverse the low *bits* bits of value, keeping the result a positive INT8"""
+    return int(format(value, f'0{bits}b')[::-1], 2)
+
+def account_key(key_scheme, index):
+    """Primary key of the account with the given index (0-999) under a key scheme"""
+    if key_scheme == 'uuid':
+        return uuid.uuid5(ACCOUNT_UUID_NAMESPACE, str(index))
+    if key_scheme == 'bit-reversed':
+        return bit_reverse(index)
+    return index
+
+def key_table_ddl(table, key_scheme, columns):
+    """CREATE TABLE statement for *table* keyed by id under a key scheme"""
+    id_type = 'UUID' if key_scheme == 'uuid' else 'INT'
+    primary_key = 'PRIMARY KEY (id) USING HASH' if key_scheme == 'hash-sharded' else 'PRIMARY KEY (id)'
+    return f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            id {id_type} NOT NULL,
+            {columns},
+            {primary_key}
+        )
+    """
+
+class TraceWriter:
+    """Append workload operations to a JSONL trace file (gzip if it ends in .gz)"""
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        self.file = gzip.open(path, 'wt') if path.endswith('.gz') else open(path, 'w')
+        self.count = 0
+    
+    def write(self, offset, worker_id, op):
+        op_type, accounts, amount = op
+        line = json.dumps({'t': round(offset, 6), 'w': worker_id, 'op': op_type,
+                           'acct': accounts, 'amt': amount}, separators=(',', ':'))
+        with self.lock:
+            self.file.write(line + '\n')
+            self.count += 1
+    
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+def load_trace(path):
+    """Load a trace written by TraceWriter as (offset, worker_id, op) tuples sorted by offset"""
+    entries = []
+    with (gzip.open(path, 'rt') if path.endswith('.gz') else open(path)) as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                entries.append((record['t'], record['w'], (record['op'], record['acct'], record['amt'])))
+    entries.sort(key=lambda entry: entry[0])
+    return entries
+
 class SimpleBankWorkload:
     """Simple bank workload generator"""
     
-    def __init__(self, connection_string):
+    def __init__(self, connection_string, seed=None, read_staleness='exact', read_batch=1,
+                 key_scheme='sequential'):
         self.connection_string = connection_string
+        self.key_scheme = key_scheme
+        self.seed = seed
+        self.read_staleness = read_staleness
+        self.read_mode, self.read_as_of = parse_read_staleness(read_staleness)
+        self.read_batch = read_batch
+        # Stale reads are reported separately so they can be compared with exact ones
+        self.read_op_name = 'read' if self.read_mode == 'exact' else f'{self.read_mode} read'
+        # with_max_staleness() only serves single-row reads, so multi-row reads
+        # fall back to follower reads under bounded staleness
+        self.multiread_mode, self.multiread_as_of = self.read_mode, self.read_as_of
+        if self.read_mode == 'bounded':
+            self.multiread_mode, self.multiread_as_of = parse_read_staleness('follower')
+            if read_batch > 1:
+                print("⚠️  Bounded staleness only serves single-row reads; "
+                      "multireads use follower_read_timestamp() instead")
+        self.multiread_op_name = ('multiread' if self.multiread_mode == 'exact'
+                                  else f'{self.multiread_mode} multiread')
         self.stats = BankWorkloadStats()
+        self.trace = None
+        psycopg2.extras.register_uuid()
+    
+    def worker_rng(self, worker_id):
+        """Per-worker random generator, reproducible when a seed is set"""
+        if self.seed is None:
+            return random.Random()
+        return random.Random(f"{self.seed}-{worker_id}")
+    
+    def next_operation(self, rng):
+        """Draw the next operation as (op_type, accounts, amount)"""
+        # 80% transfers, 20% reads (similar to cockroach workload bank)
+        if rng.random() < 0.8:
+            # Pick two different random accounts
+            from_account = rng.randint(0, 999)
+            to_account = rng.randint(0, 999)
+            while to_account == from_account:
+                to_account = rng.randint(0, 999)
+            
+            # Random transfer amount (1-100)
+            return ('transfer', [from_account, to_account], rng.randint(1, 100))
+        if self.read_batch > 1:
+            return ('multiread', rng.sample(range(1000), self.read_batch), None)
+        return ('read', [rng.randint(0, 999)], None)
+    
+    def execute_operation(self, conn, op):
+        """Run an operation drawn by next_operation or loaded from a trace"""
+        op_type, accounts, amount = op
+        # Operations refer to accounts by index; translate to this schema's keys
+        accounts = [account_key(self.key_scheme, index) for index in accounts]
+        if op_type == 'transfer':
+            self.transfer_funds(conn, accounts[0], accounts[1], amount)
+        elif op_type == 'multiread':
+            self.read_balances(conn, accounts)
+        else:
+            self.read_balance(conn, accounts[0])
     
     def init_schema(self):
         """Initialize the bank schema (equivalent to 'cockroach workload init bank')"""
-        print("🏦 Initializing Bank schema...")
+        print(f"🏦 Initializing Bank schema ({self.key_scheme} keys)...")
         
         try:
             conn = psycopg2.connect(self.connection_string)
@@ -76,12 +293,7 @@ class SimpleBankWorkload:
             cur.execute("DROP TABLE IF EXISTS accounts CASCADE")
 
             # Create accounts table
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS accounts (
-                    id INT PRIMARY KEY,
-                    balance INT NOT NULL
-                )
-            """)
+            cur.execute(key_table_ddl('accounts', self.key_scheme, 'balance INT NOT NULL'))
             
             # Create initial accounts (0-999)
             print("📊 Creating initial accounts...")
@@ -93,14 +305,13 @@ class SimpleBankWorkload:
                 batch_size = 100
                 for i in range(0, 1000, batch_size):
                     values = []
-                    for account_id in range(i, min(i + batch_size, 1000)):
+                    for index in range(i, min(i + batch_size, 1000)):
                         initial_balance = 1000
-                        values.append(f"({account_id}, {initial_balance})")
+                        values.append((account_key(self.key_scheme, index), initial_balance))
                     
                     if values:
-                        cur.execute(f"""
-                            INSERT INTO accounts (id, balance) VALUES {','.join(values)}
-                        """)
+                        psycopg2.extras.execute_values(
+                            cur, "INSERT INTO accounts (id, balance) VALUES %s", values, page_size=batch_size)
                 
                 conn.commit()
                 print(f"✓ Created 1000 accounts with initial balance of $1000 each")
@@ -117,22 +328,12 @@ class SimpleBankWorkload:
             print(f"❌ Schema initialization failed: {e}")
             return False
     
-    def transfer_funds(self, conn):
-        """Perform a random funds transfer between accounts"""
+    def transfer_funds(self, conn, from_account, to_account, amount):
+        """Transfer funds between two accounts"""
+        start = time.perf_counter()
         try:
             cur = conn.cursor()
             
-            # Pick two random accounts
-            from_account = random.randint(0, 999)
-            to_account = random.randint(0, 999)
-            
-            # Ensure different accounts
-            while to_account == from_account:
-                to_account = random.randint(0, 999)
-            
-            # Random transfer amount (1-100)
-            amount = random.randint(1, 100)
-            
             # Check source account balance
             cur.execute("SELECT balance FROM accounts WHERE id = %s", (from_account,))
             result = cur.fetchone()
@@ -148,52 +349,94 @@ class SimpleBankWorkload:
             cur.execute("UPDATE accounts SET balance = balance + %s WHERE id = %s", (amount, to_account))
             
             conn.commit()
-            self.stats.record_operation('transfer', True)
+            self.stats.record_operation('transfer', True, time.perf_counter() - start)
             
         except Exception as e:
             conn.rollback()
             self.stats.record_operation('transfer', False)
             # Reconnection logic could be added here
     
-    def read_balance(self, conn):
-        """Read a random account balance"""
+    def execute_read(self, conn, cur, query, params, as_of=None):
+        """Run a read query AS OF SYSTEM TIME *as_of* (default: the read staleness), if any"""
+        as_of = as_of or self.read_as_of
+        if not as_of:
+            cur.execute(query.format(as_of=''), params)
+            return
+        
+        # Run as an implicit transaction, as bounded staleness requires,
+        # so that followers can serve the read instead of the leaseholder
+        conn.rollback()
+        conn.autocommit = True
+        try:
+            cur.execute(query.format(as_of=f' AS OF SYSTEM TIME {as_of}'), params)
+        finally:
+            conn.autocommit = False
+    
+    def read_balance(self, conn, account_id):
+        """Read an account balance"""
+        start = time.perf_counter()
         try:
             cur = conn.cursor()
-            account_id = random.randint(0, 999)
             
-            cur.execute("SELECT balance FROM accounts WHERE id = %s", (account_id,))
+            self.execute_read(conn, cur, "SELECT balance FROM accounts{as_of} WHERE id = %s", (account_id,))
             result = cur.fetchone()
             
             if result:
-                self.stats.record_operation('read', True)
+                self.stats.record_operation(self.read_op_name, True, time.perf_counter() - start)
             else:
-                self.stats.record_operation('read', False)
+                self.stats.record_operation(self.read_op_name, False)
                 
         except Exception as e:
-            self.stats.record_operation('read', False)
+            self.stats.record_operation(self.read_op_name, False)
     
-    def worker_thread(self, worker_id, duration):
-        """Worker thread that generates load"""
+    def read_balances(self, conn, account_ids):
+        """Read several account balances with a single query"""
+        start = time.perf_counter()
+        try:
+            cur = conn.cursor()
+            
+            self.execute_read(conn, cur, "SELECT id, balance FROM accounts{as_of} WHERE id = ANY(%s)",
+                              (list(account_ids),), self.multiread_as_of)
+            rows = cur.fetchall()
+            
+            if len(rows) == len(account_ids):
+                self.stats.record_operation(self.multiread_op_name, True, time.perf_counter() - start,
+                                            keys=len(account_ids))
+            else:
+                self.stats.record_operation(self.multiread_op_name, False)
+                
+        except Exception as e:
+            self.stats.record_operation(self.multiread_op_name, False)
+    
+    def connect_worker(self, worker_id):
+        """Open a worker connection to the bank database, or return None"""
         bank_conn_string = self.connection_string.replace('/defaultdb', '/bank').replace('/postgres', '/bank')
         
         try:
             conn = psycopg2.connect(bank_conn_string)
             conn.autocommit = False
             print(f"Worker {worker_id} connected")
+            return conn
         except Exception as e:
             print(f"Worker {worker_id} failed to connect: {e}")
+            return None
+    
+    def worker_thread(self, worker_id, duration, start_time):
+        """Worker thread that generates load"""
+        conn = self.connect_worker(worker_id)
+        if conn is None:
             return
         
+        rng = self.worker_rng(worker_id)
         end_time = time.time() + duration
         operations_count = 0
         
         try:
             while time.time() < end_time:
-                # 80% transfers, 20% reads (similar to cockroach workload bank)
-                if random.random() < 0.8:
-                    self.transfer_funds(conn)
-                else:
-                    self.read_balance(conn)
+                op = self.next_operation(rng)
+                if self.trace:
+                    self.trace.write(time.time() - start_time, worker_id, op)
+                self.execute_operation(conn, op)
                 
                 operations_count += 1
                 
@@ -211,34 +454,282 @@ class SimpleBankWorkload:
             except:
                 pass
     
-    def run_workload(self, duration=60, workers=5):
-        """Run the bank workload (equivalent to 'cockroach workload run bank')"""
-        print(f"🚀 Starting Bank workload...")
-        print(f"Duration: {duration}s, Workers: {workers}")
-        print("="*50)
+    def replay_connection(self, worker_id, pending, lags):
+        """Connection thread that runs trace operations as the scheduler releases them"""
+        conn = self.connect_worker(worker_id)
+        if conn is None:
+            return
         
-        # Test connection first
+        operations_count = 0
+        worker_lags = []
+        
+        try:
+            while True:
+                item = pending.get()
+                if item is None:
+                    break
+                due, op = item
+                worker_lags.append(max(0.0, time.time() - due))
+                self.execute_operation(conn, op)
+                operations_count += 1
+                
+        except KeyboardInterrupt:
+            pass
+        except Exception as e:
+            print(f"Worker {worker_id} error: {e}")
+        finally:
+            print(f"Worker {worker_id} replayed {operations_count} operations")
+            lags.extend(worker_lags)
+            try:
+                conn.close()
+            except:
+                pass
+    
+    def schedule_replay(self, entries, start_time, speed, pending, connections):
+        """Release every trace operation when it is due, whether or not earlier ones finished"""
+        for offset, _, op in entries:
+            delay = start_time + offset / speed - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            pending.put((start_time + offset / speed, op))
+        for _ in range(connections):
+            pending.put(None)
+    
+    def check_connection(self):
+        """Make sure the bank database is reachable before starting workers"""
         try:
             bank_conn_string = self.connection_string.replace('/defaultdb', '/bank').replace('/postgres', '/bank')
             test_conn = psycopg2.connect(bank_conn_string)
             test_conn.close()
+            return True
         except Exception as e:
             print(f"❌ Cannot connect to bank database: {e}")
             print("💡 Did you run the init command first?")
             return False
+    
+    def run_workload(self, duration=60, workers=5, record=None):
+        """Run the bank workload (equivalent to 'cockroach workload run bank')"""
+        print(f"🚀 Starting Bank workload...")
+        print(f"Duration: {duration}s, Workers: {workers}, Read staleness: {self.read_staleness}, "
+              f"Read batch: {self.read_batch}")
+        if self.seed is not None:
+            print(f"Seed: {self.seed}")
+        print("="*50)
+        
+        # Test connection first
+        if not self.check_connection():
+            return False
+        
+        if record:
+            self.trace = TraceWriter(record)
+        
+        threads = self.start_workers(duration, workers)
+        self.wait_for_workers(threads)
+        
+        if self.trace:
+            self.trace.close()
+            print(f"📼 Recorded {self.trace.count:,} operations to {record}")
         
-        # Start worker threads
+        self.print_results()
+        return True
+    
+    def start_workers(self, duration, workers, first_worker_id=1):
+        """Start the worker threads and return them"""
+        start_time = time.time()
         threads = []
         for i in range(workers):
             thread = threading.Thread(
                 target=self.worker_thread,
-                args=(i+1, duration),
+                args=(first_worker_id + i, duration, start_time),
                 daemon=True
             )
             thread.start()
             threads.append(thread)
             time.sleep(0.1)  # Stagger starts
+        return threads
+    
+    def replay_workload(self, trace_path, speed=1.0, workers=None):
+        """Play back a recorded trace at the given speed multiplier
+        
+        Replay is open loop: a scheduler releases each operation when it is
+        due and any free connection out of *workers* (default: one per
+        recorded worker) runs it, so a slow operation does not hold back the
+        ones after it. Time spent waiting for a free connection is reported
+        as dispatch lag.
+        """
+        entries = load_trace(trace_path)
+        if not entries:
+            print(f"❌ Trace {trace_path} is empty")
+            return False
+        if workers is None:
+            workers = len({entry[1] for entry in entries})
+        
+        print(f"⏯️  Replaying {len(entries):,} operations from {trace_path}")
+        print(f"Speed: {speed}x, Connections: {workers}, "
+              f"Expected duration: {entries[-1][0] / speed:.1f}s")
+        print("="*50)
+        
+        if not self.check_connection():
+            return False
+        
+        # Give every connection time to open before the first operation is due
+        start_time = time.time() + 1
+        self.stats.start_time = start_time
+        pending = queue.Queue()
+        lags = []
+        threads = []
+        for i in range(workers):
+            thread = threading.Thread(
+                target=self.replay_connection,
+                args=(i+1, pending, lags),
+                daemon=True
+            )
+            thread.start()
+            threads.append(thread)
+        scheduler = threading.Thread(
+            target=self.schedule_replay,
+            args=(entries, start_time, speed, pending, workers),
+            daemon=True
+        )
+        scheduler.start()
+        threads.append(scheduler)
+        
+        self.wait_for_workers(threads)
+        self.print_results()
+        
+        if lags:
+            lags.sort()
+            late = len(lags) - bisect.bisect_right(lags, 0.010)
+            print(f"Dispatch lag:      p50 {lags[len(lags) // 2] * 1000:.1f}ms, "
+                  f"p99 {lags[min(len(lags) - 1, int(len(lags) * 0.99))] * 1000:.1f}ms, "
+                  f"max {lags[-1] * 1000:.1f}ms")
+            print(f"Behind schedule:   {late:,} operations started more than 10ms late")
+        else:
+            print("Behind schedule:   0 operations")
+        print("="*50)
+        return True
+    
+    def benchmark_key_schemes(self, duration=60, workers=5, key_schemes=KEY_SCHEMES, range_max_mb=None):
+        """Measure insert throughput and range distribution for each key scheme
+        
+        For every scheme a fresh key_scheme_bench table receives single-row
+        inserts with client-generated keys for *duration* seconds, then
+        SHOW RANGES shows how the data and leases ended up spread. Setting
+        *range_max_mb* lowers the table's range size so splits show up
+        without loading gigabytes.
+        """
+        print(f"🔑 Key scheme benchmark: {', '.join(key_schemes)}")
+        print(f"Duration: {duration}s per scheme, Workers: {workers}")
+        print("="*50)
+        
+        if not self.check_connection():
+            return False
+        
+        bank_conn_string = self.connection_string.replace('/defaultdb', '/bank').replace('/postgres', '/bank')
+        results = {}
+        for key_scheme in key_schemes:
+            conn = psycopg2.connect(bank_conn_string)
+            conn.autocommit = True
+            cur = conn.cursor()
+            cur.execute("DROP TABLE IF EXISTS key_scheme_bench")
+            cur.execute(key_table_ddl('key_scheme_bench', key_scheme,
+                                      'payload STRING NOT NULL, created_at TIMESTAMPTZ NOT NULL DEFAULT now()'))
+            if range_max_mb:
+                cur.execute("ALTER TABLE key_scheme_bench CONFIGURE ZONE USING "
+                            "range_min_bytes = %s, range_max_bytes = %s",
+                            (int(range_max_mb * 1024 * 1024 / 4), int(range_max_mb * 1024 * 1024)))
+            
+            stats = BankWorkloadStats()
+            counter = iter(range(sys.maxsize))
+            counter_lock = threading.Lock()
+            end_time = time.time() + duration
+            
+            def insert_worker():
+                try:
+                    worker_conn = psycopg2.connect(bank_conn_string)
+                    worker_conn.autocommit = True
+                except Exception as e:
+                    print(f"Insert worker failed to connect: {e}")
+                    return
+                worker_cur = worker_conn.cursor()
+                try:
+                    while time.time() < end_time:
+                        with counter_lock:
+                            n = next(counter)
+                        start = time.perf_counter()
+                        try:
+                            worker_cur.execute("INSERT INTO key_scheme_bench (id, payload) VALUES (%s, %s)",
+                                               (account_key(key_scheme, n), f"row {n}"))
+                            stats.record_operation('insert', True, time.perf_counter() - start)
+                        except psycopg2.Error:
+                            stats.record_operation('insert', False)
+                finally:
+                    worker_conn.close()
+            
+            threads = [threading.Thread(target=insert_worker, daemon=True) for _ in range(workers)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            
+            insert_stats = stats.get_stats()
+            results[key_scheme] = {
+                'inserts_per_second': insert_stats['ops_per_second'],
+                'errors': insert_stats['total_errors'],
+                'latency': insert_stats['latency_breakdown'].get('insert', {}),
+                **self.range_distribution(cur, 'key_scheme_bench')
+            }
+            cur.execute("DROP TABLE IF EXISTS key_scheme_bench")
+            conn.close()
+            print(f"✓ {key_scheme}: {results[key_scheme]['inserts_per_second']:.1f} inserts/sec")
         
+        print("\n" + "="*50)
+        print("🏁 KEY SCHEME BENCHMARK COMPLETE")
+        print("="*50)
+        print(f"{'scheme':<13} {'ins/sec':>9} {'p50 ms':>8} {'p99 ms':>8} {'ranges':>7} "
+              f"{'leases':>7} {'lease skew':>11} {'size skew':>10}")
+        for key_scheme, result in results.items():
+            latency = result['latency']
+            print(f"{key_scheme:<13} {result['inserts_per_second']:>9.1f} {latency.get('p50', 0):>8.1f} "
+                  f"{latency.get('p99', 0):>8.1f} {result['ranges']:>7} {result['leaseholders']:>7} "
+                  f"{result['lease_skew']:>11.2f} {result['size_skew']:>10.2f}")
+        print("Skew is max/mean per range leaseholder (leases) and per range (size); 1.00 is perfectly even.")
+        print("="*50)
+        return results
+    
+    @staticmethod
+    def range_distribution(cur, table):
+        """Summarize SHOW RANGES for a table: range count and lease/size skew"""
+        try:
+            cur.execute(f"SHOW RANGES FROM TABLE {table} WITH DETAILS")
+        except psycopg2.Error:
+            # Versions before 23.1 report the details without the option
+            cur.execute(f"SHOW RANGES FROM TABLE {table}")
+        columns = [column[0] for column in cur.description]
+        rows = [dict(zip(columns, row)) for row in cur.fetchall()]
+        
+        leases = defaultdict(int)
+        sizes = []
+        for row in rows:
+            leases[row.get('lease_holder')] += 1
+            size = row.get('range_size_mb', row.get('range_size'))
+            if size is not None:
+                sizes.append(float(size))
+        
+        def skew(values):
+            values = list(values)
+            mean = sum(values) / len(values) if values else 0
+            return max(values) / mean if mean else 0.0
+        
+        return {
+            'ranges': len(rows),
+            'leaseholders': len(leases),
+            'lease_skew': skew(leases.values()),
+            'size_skew': skew(sizes)
+        }
+    
+    def wait_for_workers(self, threads):
+        """Print progress until every worker thread has finished"""
         # Monitor progress
         last_print = time.time()
         
@@ -261,8 +752,9 @@ class SimpleBankWorkload:
         # Wait for threads to finish
         for thread in threads:
             thread.join(timeout=2)
-        
-        # Print final results
+    
+    def print_results(self):
+        """Print the final workload statistics"""
         final_stats = self.stats.get_stats()
         print("\n" + "="*50)
         print("🏁 WORKLOAD COMPLETE")
@@ -274,11 +766,203 @@ class SimpleBankWorkload:
         
         if final_stats['operations_breakdown']:
             print("\nOperations Breakdown:")
+            elapsed = final_stats['elapsed_time']
             for op_type, count in final_stats['operations_breakdown'].items():
-                print(f"  {op_type.capitalize()}: {count:,}")
+                rate = count / elapsed if elapsed > 0 else 0
+                print(f"  {op_type.capitalize()}: {count:,} ({rate:.1f} ops/sec)")
+        
+        if final_stats['latency_breakdown']:
+            print("\nLatency (ms):")
+            for op_type, latency in final_stats['latency_breakdown'].items():
+                print(f"  {op_type.capitalize()}: p50 {latency['p50']:.1f} | "
+                      f"p95 {latency['p95']:.1f} | p99 {latency['p99']:.1f}")
+                keys = final_stats['keys_breakdown'].get(op_type)
+                batches = final_stats['operations_breakdown'].get(op_type)
+                if keys and batches:
+                    # Scale batch latency down by the keys each batch actually fetched
+                    per_batch = keys / batches
+                    rate = keys / final_stats['elapsed_time'] if final_stats['elapsed_time'] > 0 else 0
+                    print(f"    per key ({per_batch:g} keys/batch, {rate:.1f} keys/sec): "
+                          f"p50 {latency['p50'] / per_batch:.2f} | "
+                          f"p95 {latency['p95'] / per_batch:.2f} | "
+                          f"p99 {latency['p99'] / per_batch:.2f}")
         
         print("="*50)
-        return True
+
+def send_message(stream, message):
+    """Write one newline-delimited JSON message to a socket stream"""
+    stream.write(json.dumps(message, separators=(',', ':')) + '\n')
+    stream.flush()
+
+def receive_message(stream):
+    """Read one newline-delimited JSON message, or None when the peer hung up"""
+    line = stream.readline()
+    return json.loads(line) if line else None
+
+def parse_address(address, default_host='0.0.0.0'):
+    """Split 'host:port' (or just 'port') into a (host, port) tuple"""
+    host, _, port = address.rpartition(':')
+    return (host or default_host, int(port))
+
+def run_agent(listen, once=False):
+    """Wait for a coordinator, run the workload it describes and stream stats back
+    
+    Protocol (one JSON object per line):
+      coordinator -> agent  {"type": "config", "connection_string", "duration", "workers", "seed",
+                             "read_staleness", "read_batch", "key_scheme", "agent_index"}
+      agent -> coordinator  {"type": "ready"} or {"type": "error", "message"}
+      coordinator -> agent  {"type": "start", "delay": seconds}
+      agent -> coordinator  {"type": "stats", "snapshot"} every second, then {"type": "done", "snapshot"}
+    """
+    server = socket.create_server(parse_address(listen))
+    print(f"🛰️  Agent listening on {listen}")
+    
+    try:
+        while True:
+            sock, peer = server.accept()
+            print(f"Coordinator connected from {peer[0]}:{peer[1]}")
+            with sock, sock.makefile('rw') as stream:
+                try:
+                    serve_coordinator(stream)
+                except (OSError, ValueError) as e:
+                    print(f"❌ Coordinator session failed: {e}")
+            if once:
+                break
+    except KeyboardInterrupt:
+        print("\n🛑 Agent stopped")
+    finally:
+        server.close()
+
+def serve_coordinator(stream):
+    """Handle one coordinator session for run_agent"""
+    config = receive_message(stream)
+    if not config or config.get('type') != 'config':
+        raise ValueError(f"expected config message, got {config}")
+    
+    workload = SimpleBankWorkload(config['connection_string'], seed=config.get('seed'),
+                                  read_staleness=config.get('read_staleness', 'exact'),
+                                  read_batch=config.get('read_batch', 1),
+                                  key_scheme=config.get('key_scheme', 'sequential'))
+    if not workload.check_connection():
+        send_message(stream, {'type': 'error', 'message': 'cannot connect to bank database'})
+        return
+    send_message(stream, {'type': 'ready'})
+    
+    start = receive_message(stream)
+    if not start or start.get('type') != 'start':
+        raise ValueError(f"expected start message, got {start}")
+    time.sleep(start['delay'])
+    
+    workers = config['workers']
+    workload.stats.start_time = time.time()
+    threads = workload.start_workers(config['duration'], workers,
+                                     first_worker_id=config['agent_index'] * workers + 1)
+    while any(t.is_alive() for t in threads):
+        time.sleep(1)
+        send_message(stream, {'type': 'stats', 'snapshot': workload.stats.snapshot()})
+    send_message(stream, {'type': 'done', 'snapshot': workload.stats.snapshot()})
+    print(f"✅ Agent run complete: {workload.stats.get_stats()['total_operations']:,} operations")
+
+# Seconds the coordinator waits for an agent to connect and report ready
+AGENT_HANDSHAKE_TIMEOUT = 30
+
+def run_coordinator(connection_string, agents, duration=60, workers=5, seed=None,
+                    read_staleness='exact', read_batch=1, key_scheme='sequential', start_delay=2.0):
+    """Drive several agents in lockstep and merge their statistics into one report"""
+    print(f"🎛️  Coordinating {len(agents)} agents")
+    print(f"Duration: {duration}s, Workers per agent: {workers}")
+    print("="*50)
+    
+    sockets = []
+    streams = []
+    try:
+        for index, address in enumerate(agents):
+            sock = socket.create_connection(parse_address(address, 'localhost'), timeout=AGENT_HANDSHAKE_TIMEOUT)
+            sockets.append(sock)
+            stream = sock.makefile('rw')
+            streams.append(stream)
+            send_message(stream, {'type': 'config', 'connection_string': connection_string,
+                                  'duration': duration, 'workers': workers, 'seed': seed,
+                                  'read_staleness': read_staleness, 'read_batch': read_batch,
+                                  'key_scheme': key_scheme, 'agent_index': index})
+        
+        for address, stream in zip(agents, streams):
+            reply = receive_message(stream)
+            if not reply or reply.get('type') != 'ready':
+                print(f"❌ Agent {address} is not ready: {reply}")
+                return False
+            print(f"Agent {address} ready")
+        
+        # Agents stay silent while their workers start (staggered 0.1s apart),
+        # so stop timing out reads once the handshake is done
+        for sock in sockets:
+            sock.settimeout(None)
+        
+        # Everyone gets the same relative start time, so runs begin together
+        for stream in streams:
+            send_message(stream, {'type': 'start', 'delay': start_delay})
+        
+        snapshots = {}
+        finished = set()
+        lock = threading.Lock()
+        
+        def collect(address, stream):
+            while True:
+                try:
+                    message = receive_message(stream)
+                except (OSError, ValueError) as e:
+                    message = None
+                    print(f"❌ Lost agent {address}: {e}")
+                if message is None:
+                    break
+                with lock:
+                    snapshots[address] = message['snapshot']
+                if message['type'] == 'done':
+                    break
+            with lock:
+                finished.add(address)
+        
+        collectors = [threading.Thread(target=collect, args=(address, stream), daemon=True)
+                      for address, stream in zip(agents, streams)]
+        for collector in collectors:
+            collector.start()
+        
+        last_print = time.time()
+        try:
+            while len(finished) < len(agents):
+                time.sleep(1)
+                if time.time() - last_print >= 10:
+                    with lock:
+                        merged = BankWorkloadStats.merge_snapshots(snapshots.values())
+                    stats = BankWorkloadStats.from_snapshot(merged).get_stats()
+                    print(f"[{datetime.now().strftime('%H:%M:%S')}] "
+                          f"Ops: {stats['total_operations']:,} | "
+                          f"Rate: {stats['ops_per_second']:.1f} ops/sec | "
+                          f"Errors: {stats['total_errors']:,} | "
+                          f"Agents done: {len(finished)}/{len(agents)}")
+                    last_print = time.time()
+        except KeyboardInterrupt:
+            print("\n🛑 Stopping coordinator...")
+        
+        with lock:
+            per_agent = dict(snapshots)
+    finally:
+        for stream in streams + sockets:
+            try:
+                stream.close()
+            except OSError:
+                pass
+    
+    report = SimpleBankWorkload(connection_string)
+    report.stats = BankWorkloadStats.from_snapshot(BankWorkloadStats.merge_snapshots(per_agent.values()))
+    report.print_results()
+    print("Per-agent Operations:")
+    for address in agents:
+        snapshot = per_agent.get(address)
+        operations = sum(snapshot['operations'].values()) if snapshot else 0
+        print(f"  {address}: {operations:,}")
+    print("="*50)
+    return True
 
 def main():
     parser = argparse.ArgumentParser(
@@ -291,28 +975,129 @@ Examples:
   
   # Run workload for 5 minutes with 10 workers
   python simple_bank_workload.py run --duration 300 --workers 10 \\
+    "postgresql://root@localhost:26257/defaultdb?sslmode=disable"
+  
+  # Record a reproducible run to a trace file
+  python simple_bank_workload.py run --duration 300 --seed 42 --record bank.jsonl.gz \\
+    "postgresql://root@localhost:26257/defaultdb?sslmode=disable"
+  
+  # Drive the same load from several hosts: start an agent on each host ...
+  python simple_bank_workload.py agent --listen 0.0.0.0:7070
+  
+  # ... then start them together and merge their stats from one coordinator
+  python simple_bank_workload.py coordinator --agents host1:7070,host2:7070 --duration 300 \\
+    "postgresql://root@localhost:26257/defaultdb?sslmode=disable"
+  
+  # Serve reads from follower replicas instead of the leaseholders
+  python simple_bank_workload.py run --read-staleness follower \\
+    "postgresql://root@localhost:26257/defaultdb?sslmode=disable"
+  
+  # Read 20 balances per query instead of one
+  python simple_bank_workload.py run --read-batch 20 \\
+    "postgresql://root@localhost:26257/defaultdb?sslmode=disable"
+  
+  # Initialize and run with hash-sharded account keys
+  python simple_bank_workload.py init --key-scheme hash-sharded \\
+    "postgresql://root@localhost:26257/defaultdb?sslmode=disable"
+  python simple_bank_workload.py run --key-scheme hash-sharded \\
+    "postgresql://root@localhost:26257/defaultdb?sslmode=disable"
+  
+  # Compare insert throughput and range skew of every key scheme
+  python simple_bank_workload.py keybench --duration 60 --workers 10 --range-max-mb 1 \\
+    "postgresql://root@localhost:26257/defaultdb?sslmode=disable"
+  
+  # Replay the trace at twice the recorded speed
+  python simple_bank_workload.py replay --trace bank.jsonl.gz --speed 2 \\
     "postgresql://root@localhost:26257/defaultdb?sslmode=disable"
         """)
     
-    parser.add_argument('command', choices=['init', 'run'], 
-                       help='Command to execute (init=setup schema, run=generate load)')
-    parser.add_argument('connection_string', 
-                       help='PostgreSQL connection string')
+    parser.add_argument('command', choices=['init', 'run', 'replay', 'coordinator', 'agent', 'keybench'], 
+                       help='Command to execute (init=setup schema, run=generate load, '
+                            'replay=play back a recorded trace, coordinator=drive agents, '
+                            'agent=generate load for a coordinator, '
+                            'keybench=compare insert throughput and range skew of key schemes)')
+    parser.add_argument('connection_string', nargs='?',
+                       help='PostgreSQL connection string (not used by agent)')
     parser.add_argument('--duration', type=int, default=60,
                        help='Duration in seconds (for run command)')
-    parser.add_argument('--workers', type=int, default=5,
-                       help='Number of worker threads (for run command)')
+    parser.add_argument('--workers', type=int,
+                       help='Number of worker threads, default 5 (per agent for coordinator command; '
+                            'for replay: connections, default one per recorded worker)')
+    parser.add_argument('--seed', type=int,
+                       help='Seed for reproducible per-worker operation streams (for run command)')
+    parser.add_argument('--record', metavar='TRACE',
+                       help='Write every operation to this JSONL trace, gzipped if it ends in .gz '
+                            '(for run command)')
+    parser.add_argument('--trace',
+                       help='Trace file to play back (for replay command)')
+    parser.add_argument('--speed', type=float, default=1.0,
+                       help='Replay speed multiplier, e.g. 2 plays back twice as fast (for replay command)')
+    parser.add_argument('--read-staleness', default='exact',
+                       help='exact (default), follower, or bounded:<duration> e.g. bounded:10s; '
+                            'stale reads use AS OF SYSTEM TIME so any replica can serve them')
+    parser.add_argument('--read-batch', type=int, default=1, metavar='K',
+                       help='Fetch K random accounts per read with one WHERE id = ANY(...) query '
+                            '(multiread operation); 1 keeps single-key reads')
+    parser.add_argument('--key-scheme', choices=KEY_SCHEMES,
+                       help='Primary key layout of accounts (default sequential); run/replay must use the '
+                            'scheme given to init (for keybench: only benchmark this scheme, default all)')
+    parser.add_argument('--range-max-mb', type=float,
+                       help='Shrink the benchmark table\'s ranges to this size so splits show up (for keybench)')
+    parser.add_argument('--agents',
+                       help='Comma-separated host:port list of agents (for coordinator command)')
+    parser.add_argument('--listen', default='0.0.0.0:7070',
+                       help='host:port to accept a coordinator on (for agent command)')
+    parser.add_argument('--once', action='store_true',
+                       help='Exit after serving one coordinator (for agent command)')
     
     args = parser.parse_args()
     
-    workload = SimpleBankWorkload(args.connection_string)
+    if args.command == 'agent':
+        run_agent(args.listen, once=args.once)
+        sys.exit(0)
+    
+    if not args.connection_string:
+        parser.error('connection_string is required')
+    if args.command == 'coordinator' and not args.agents:
+        parser.error('coordinator requires --agents')
+    if args.command == 'replay' and not args.trace:
+        parser.error('replay requires --trace')
+    if args.speed <= 0:
+        parser.error('--speed must be positive')
+    
+    try:
+        parse_read_staleness(args.read_staleness)
+    except argparse.ArgumentTypeError as e:
+        parser.error(str(e))
+    
+    if not 1 <= args.read_batch <= 1000:
+        parser.error('--read-batch must be between 1 and 1000')
+    
+    workload = SimpleBankWorkload(args.connection_string, seed=args.seed, read_staleness=args.read_staleness,
+                                  read_batch=args.read_batch, key_scheme=args.key_scheme or 'sequential')
     
     if args.command == 'init':
         success = workload.init_schema()
         sys.exit(0 if success else 1)
     
     elif args.command == 'run':
-        success = workload.run_workload(args.duration, args.workers)
+        success = workload.run_workload(args.duration, args.workers or 5, record=args.record)
+        sys.exit(0 if success else 1)
+    
+    elif args.command == 'replay':
+        success = workload.replay_workload(args.trace, args.speed, args.workers)
+        sys.exit(0 if success else 1)
+    
+    elif args.command == 'keybench':
+        # Without an explicit --key-scheme, compare every scheme
+        key_schemes = [args.key_scheme] if args.key_scheme else list(KEY_SCHEMES)
+        success = workload.benchmark_key_schemes(args.duration, args.workers or 5, key_schemes, args.range_max_mb)
+        sys.exit(0 if success else 1)
+    
+    elif args.command == 'coordinator':
+        agents = [address.strip() for address in args.agents.split(',') if address.strip()]
+        success = run_coordinator(args.connection_string, agents, args.duration, args.workers or 5, args.seed,
+                                  args.read_staleness, args.read_batch, workload.key_scheme)
         sys.exit(0 if success else 1)
 
 if __name__ == '__main__':
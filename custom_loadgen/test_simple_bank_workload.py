@@ -0,0 +1,160 @@
+"""Tests for simple_bank_workload that need no running cluster."""
+
+import errno
+import json
+import socket
+import threading
+import time
+
+import simple_bank_workload
+from simple_bank_workload import SimpleBankWorkload, run_agent, run_coordinator
+
+
+class FakeConnection:
+    def close(self):
+        pass
+
+
+class OfflineWorkload(SimpleBankWorkload):
+    """Workload whose connections and operations never touch a database."""
+
+    def __init__(self, slow_ops=(), op_time=0.01):
+        super().__init__('postgresql://root@localhost:26257/defaultdb')
+        self.slow_ops = slow_ops
+        self.op_time = op_time
+        self.started = []
+        self.lock = threading.Lock()
+
+    def check_connection(self):
+        return True
+
+    def connect_worker(self, worker_id):
+        return FakeConnection()
+
+    def execute_operation(self, conn, op):
+        with self.lock:
+            self.started.append((time.time(), op))
+        time.sleep(5 * self.op_time if op[1][0] in self.slow_ops else self.op_time)
+        self.stats.record_operation(op[0], True, self.op_time)
+
+
+def write_trace(path, entries):
+    with open(path, 'w') as f:
+        for offset, worker_id, account in entries:
+            f.write(json.dumps({'t': offset, 'w': worker_id, 'op': 'read', 'acct': [account], 'amt': None}) + '\n')
+
+
+def test_replay_is_open_loop(tmp_path):
+    # One recorded worker; its first operation is slow, the others are due while it runs
+    trace = tmp_path / 'trace.jsonl'
+    write_trace(trace, [(0.0, 1, 0), (0.1, 1, 1), (0.2, 1, 2), (0.3, 1, 3)])
+    workload = OfflineWorkload(slow_ops={0}, op_time=0.1)
+
+    assert workload.replay_workload(str(trace), workers=2)
+
+    starts = {op[1][0]: started for started, op in workload.started}
+    assert len(starts) == 4
+    # Operation 1 starts on time on the second connection instead of waiting for operation 0
+    assert starts[1] - starts[0] < 0.2
+
+
+def test_replay_defaults_to_one_connection_per_recorded_worker(tmp_path, capsys):
+    trace = tmp_path / 'trace.jsonl'
+    write_trace(trace, [(0.0, worker_id, worker_id) for worker_id in range(1, 11)])
+    workload = OfflineWorkload()
+
+    assert workload.replay_workload(str(trace))
+
+    assert "Connections: 10" in capsys.readouterr().out
+    assert len(workload.started) == 10
+
+
+class FakeReadConnection:
+    """Connection whose cursors return one row per requested account id."""
+
+    def cursor(self):
+        return FakeReadCursor()
+
+
+class FakeReadCursor:
+    def execute(self, sql, params=None):
+        self.rows = [(account_id, 100) for account_id in params[0]]
+
+    def fetchall(self):
+        return self.rows
+
+
+def test_multiread_per_key_figures_use_keys_actually_read(capsys):
+    # Replaying a --read-batch 20 trace with the default --read-batch 1
+    workload = SimpleBankWorkload('postgresql://root@localhost:26257/defaultdb')
+    for _ in range(3):
+        workload.read_balances(FakeReadConnection(), list(range(20)))
+
+    workload.print_results()
+
+    assert "per key (20 keys/batch" in capsys.readouterr().out
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_listening(port, timeout=5.0):
+    """Wait until something listens on *port*, without connecting to it."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        with socket.socket() as probe:
+            try:
+                probe.bind(('127.0.0.1', port))
+            except OSError as e:
+                if e.errno == errno.EADDRINUSE:
+                    return
+                raise
+        time.sleep(0.01)
+    raise TimeoutError(f"nothing listening on port {port}")
+
+
+def test_coordinator_merges_stats_from_local_agents(monkeypatch, capsys):
+    first_worker_ids = []
+
+    def start_workers(self, duration, workers, first_worker_id=1):
+        first_worker_ids.append(first_worker_id)
+        # Starting takes longer than the handshake timeout, like a large staggered agent
+        time.sleep(0.5)
+
+        def worker():
+            for _ in range(10):
+                self.stats.record_operation('transfer', True, 0.001)
+
+        threads = [threading.Thread(target=worker) for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+        return threads
+
+    monkeypatch.setattr(SimpleBankWorkload, 'check_connection', lambda self: True)
+    monkeypatch.setattr(SimpleBankWorkload, 'start_workers', start_workers)
+    monkeypatch.setattr(simple_bank_workload, 'AGENT_HANDSHAKE_TIMEOUT', 0.2)
+
+    ports = [free_port() for _ in range(3)]
+    agents = [threading.Thread(target=run_agent, args=(f'127.0.0.1:{port}',), kwargs={'once': True},
+                               daemon=True)
+              for port in ports]
+    for agent in agents:
+        agent.start()
+    for port in ports:
+        wait_until_listening(port)
+
+    addresses = [f'127.0.0.1:{port}' for port in ports]
+    assert run_coordinator('postgresql://root@localhost:26257/defaultdb', addresses,
+                           duration=1, workers=2, start_delay=0)
+    for agent in agents:
+        agent.join(timeout=5)
+
+    output = capsys.readouterr().out
+    assert "Lost agent" not in output
+    assert "Total Operations:  60" in output
+    for address in addresses:
+        assert f"{address}: 20" in output
+    assert sorted(first_worker_ids) == [1, 3, 5]
@@ -0,0 +1,434 @@
+#!/usr/bin/env python3
+"""
+Asyncio counterpart of the enhanced CockroachDB example, built on psycopg 3.
+"""
+
+import asyncio
+import logging
+import os
+import random
+import time
+from argparse import ArgumentParser, RawTextHelpFormatter
+from collections import defaultdict
+from decimal import Decimal
+from typing import List, Dict, Optional
+
+import psycopg
+from psycopg import sql
+from psycopg.errors import SerializationFailure
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
+
+from enhanced_example import (
+    ANALYTICS_QUERIES,
+    KEY_SCHEMES,
+    TRANSACTION_HISTORY_QUERY,
+    UPDATED_AT_MODES,
+    CockroachDBManager,
+    TransactionInstrumentation,
+    TransactionStats,
+    confirm_scratch_schema,
+    latency_summary,
+    print_transfer_results,
+    run_transfer_load,
+    schema_statements,
+)
+
+
+class AsyncCockroachDBManager:
+    """Non-blocking CockroachDB manager on a psycopg 3 async connection pool.
+
+    Offers the same operations as ``CockroachDBManager`` as coroutines, so
+    asyncio services can call them without a thread executor. Transactions
+    are reported to the same ``TransactionInstrumentation`` hooks; the pool is
+    opened by ``open()`` (or ``async with``) and closed by ``close()``.
+    """
+
+    def __init__(self, dsn: str, min_connections: int = 2, max_connections: int = 10,
+                 checkout_timeout: float = 30.0, max_connection_lifetime: float = 1800.0,
+                 instrumentation: Optional[TransactionInstrumentation] = None,
+                 max_retries: int = 3, key_scheme: str = 'uuid'):
+        if key_scheme not in KEY_SCHEMES:
+            raise ValueError(f"key_scheme must be one of {KEY_SCHEMES}")
+        self.dsn = dsn
+        self.max_retries = max_retries
+        self.key_scheme = key_scheme
+        self.instrumentation = instrumentation or TransactionStats()
+        self.connection_pool = AsyncConnectionPool(
+            dsn,
+            min_size=min_connections,
+            max_size=max_connections,
+            timeout=checkout_timeout,
+            max_lifetime=max_connection_lifetime,
+            kwargs={'application_name': "async_crdb_example", 'row_factory': dict_row},
+            open=False
+        )
+        self.last_query_timings = {}
+
+    async def open(self):
+        """Open the pool and wait for its minimum connections."""
+        await self.connection_pool.open(wait=True)
+
+    async def close(self):
+        """Close all connections in the pool."""
+        await self.connection_pool.close()
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def get_pool_metrics(self) -> Dict:
+        """Pool size, waiting requests and wait time counters from psycopg_pool."""
+        return self.connection_pool.get_stats()
+
+    async def create_schema(self, updated_at_mode: str = 'trigger', key_scheme: Optional[str] = None):
+        """Create the enhanced schema; see ``schema_statements``."""
+        async with self.connection_pool.connection() as conn:
+            async with conn.cursor() as cur:
+                for statement in schema_statements(updated_at_mode, key_scheme or self.key_scheme):
+                    await cur.execute(statement)
+            await conn.commit()
+        logging.info("✓ Enhanced schema created successfully")
+
+    async def create_sample_accounts(self, count: int = 5) -> List:
+        """Create sample accounts with realistic data, returning their ids."""
+        account_types = ['checking', 'savings', 'business']
+        names = ['Alice Johnson', 'Bob Smith', 'Carol Davis', 'David Wilson', 'Eva Brown']
+
+        account_ids = []
+        async with self.connection_pool.connection() as conn:
+            async with conn.cursor() as cur:
+                for i in range(count):
+                    account_number = f"ACC{random.randint(1000000, 9999999)}"
+                    initial_balance = Decimal(str(random.uniform(500.0, 5000.0))).quantize(Decimal('0.01'))
+                    await cur.execute("""
+                        INSERT INTO accounts (account_number, owner_name, account_type, balance)
+                        VALUES (%s, %s, %s, %s)
+                        ON CONFLICT (account_number) DO NOTHING
+                        RETURNING id
+                    """, (account_number, names[i % len(names)], random.choice(account_types), initial_balance))
+
+                    row = await cur.fetchone()
+                    if row:
+                        account_ids.append(row['id'])
+            await conn.commit()
+        logging.info(f"✓ Created {count} sample accounts")
+        return account_ids
+
+    async def enhanced_transfer_funds(self, from_account_id, to_account_id, amount: Decimal,
+                                      description: str = None):
+        """Enhanced fund transfer with transaction logging and validation."""
+        async def transfer_operation(conn):
+            async with conn.cursor() as cur:
+                # Lock accounts in consistent order to prevent deadlocks
+                await cur.execute("""
+                    SELECT id, balance, is_active FROM accounts
+                    WHERE id = ANY(%s) ORDER BY id FOR UPDATE
+                """, (sorted([from_account_id, to_account_id]),))
+
+                accounts = {row['id']: row for row in await cur.fetchall()}
+
+                if from_account_id not in accounts or to_account_id not in accounts:
+                    raise ValueError("One or both accounts not found")
+
+                if not accounts[from_account_id]['is_active'] or not accounts[to_account_id]['is_active']:
+                    raise ValueError("One or both accounts are inactive")
+
+                from_balance = accounts[from_account_id]['balance']
+                if from_balance < amount:
+                    raise ValueError(f"Insufficient funds: have {from_balance}, need {amount}")
+
+                await cur.execute("UPDATE accounts SET balance = balance - %s WHERE id = %s",
+                                  (amount, from_account_id))
+                await cur.execute("UPDATE accounts SET balance = balance + %s WHERE id = %s",
+                                  (amount, to_account_id))
+
+                await cur.execute("""
+                    INSERT INTO transactions (from_account_id, to_account_id, amount, transaction_type, description)
+                    VALUES (%s, %s, %s, 'transfer', %s)
+                """, (from_account_id, to_account_id, amount, description or f"Transfer of ${amount}"))
+
+        async with self.connection_pool.connection() as conn:
+            await self.run_transaction(conn, transfer_operation)
+
+    async def bulk_deposit(self, account_amounts: Dict):
+        """Perform bulk deposits with one batched statement per table."""
+        async def bulk_operation(conn):
+            async with conn.cursor() as cur:
+                await cur.executemany("""
+                    UPDATE accounts SET balance = balance + %s
+                    WHERE id = %s AND is_active = TRUE
+                """, [(amount, account_id) for account_id, amount in account_amounts.items()])
+
+                await cur.executemany("""
+                    INSERT INTO transactions (to_account_id, amount, transaction_type, description)
+                    VALUES (%s, %s, 'deposit', %s)
+                """, [(account_id, amount, f"Bulk deposit of ${amount}")
+                      for account_id, amount in account_amounts.items()])
+
+        async with self.connection_pool.connection() as conn:
+            await self.run_transaction(conn, bulk_operation)
+
+        logging.info(f"✓ Bulk deposit completed for {len(account_amounts)} accounts")
+
+    async def get_account_analytics(self) -> Dict:
+        """Run the analytics queries concurrently, each on its own pooled connection.
+
+        Queries beyond the pool's size simply wait for a free connection. All
+        of them read AS OF SYSTEM TIME one shared timestamp, so they see the
+        same snapshot like the threaded manager's concurrent analytics.
+        Per-query timings are kept in ``self.last_query_timings``.
+        """
+        async with self.connection_pool.connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("SELECT cluster_logical_timestamp() AS snapshot")
+                snapshot = (await cur.fetchone())['snapshot']
+            await conn.rollback()
+
+        names = list(ANALYTICS_QUERIES)
+        outcomes = await asyncio.gather(*(self._run_analytics_query(name, snapshot) for name in names))
+        results = {name: rows for name, (rows, _) in zip(names, outcomes)}
+        self.last_query_timings = {name: elapsed for name, (_, elapsed) in zip(names, outcomes)}
+        return results
+
+    async def _run_analytics_query(self, name: str, as_of: Decimal):
+        """Run one registered analytics query at *as_of*, returning its rows and elapsed seconds."""
+        query, fetch_one = ANALYTICS_QUERIES[name]
+        async with self.connection_pool.connection() as conn:
+            start = time.perf_counter()
+            try:
+                async with conn.cursor() as cur:
+                    await cur.execute(sql.SQL("SET TRANSACTION AS OF SYSTEM TIME {}").format(
+                        sql.Literal(str(as_of))))
+                    await cur.execute(query)
+                    rows = await cur.fetchone() if fetch_one else await cur.fetchall()
+            finally:
+                await conn.rollback()
+            return rows, time.perf_counter() - start
+
+    async def get_transaction_history(self, account_id, limit: int = 50) -> List[Dict]:
+        """Get detailed transaction history for an account."""
+        async with self.connection_pool.connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(TRANSACTION_HISTORY_QUERY, (account_id,) * 4 + (limit,))
+                return await cur.fetchall()
+
+    async def run_transaction(self, conn, operation, max_retries: Optional[int] = None,
+                              name: Optional[str] = None):
+        """Run the coroutine function *operation* in a transaction, retrying on 40001.
+
+        Same contract as ``CockroachDBManager.run_transaction`` in its default
+        ``'rollback'`` mode, except that the exponential backoff awaits
+        ``asyncio.sleep`` so other callers keep running meanwhile.
+        """
+        max_retries = max_retries or self.max_retries
+        name = name or getattr(operation, '__name__', 'transaction')
+        instrumentation = self.instrumentation
+        start = time.perf_counter()
+        for retry in range(1, max_retries + 1):
+            instrumentation.on_attempt(name, retry)
+            attempt_start = time.perf_counter()
+            try:
+                async with conn.transaction():
+                    await operation(conn)
+                now = time.perf_counter()
+                instrumentation.on_commit(name, retry, now - start, now - attempt_start)
+                return
+            except SerializationFailure as e:
+                if retry == max_retries:
+                    instrumentation.on_failure(name, retry, time.perf_counter() - start, e.sqlstate)
+                    raise
+                sleep_time = (2 ** retry) * 0.1 * (random.random() + 0.5)
+                logging.debug(f"Serialization failure, retrying in {sleep_time:.2f}s")
+                instrumentation.on_retry(name, retry, e.sqlstate, sleep_time)
+                await asyncio.sleep(sleep_time)
+            except psycopg.Error as e:
+                instrumentation.on_failure(name, retry, time.perf_counter() - start, e.sqlstate)
+                logging.error(f"Database error: {e}")
+                raise
+            except Exception:
+                instrumentation.on_failure(name, retry, time.perf_counter() - start, None)
+                raise
+
+    def get_transaction_stats(self) -> Dict:
+        """Per-operation transaction statistics, when the instrumentation keeps them."""
+        snapshot = getattr(self.instrumentation, 'snapshot', None)
+        return snapshot() if snapshot else {}
+
+
+async def demonstrate_async_features(dsn: str, updated_at_mode: str = 'trigger', key_scheme: str = 'uuid'):
+    """Demonstrate the async manager, with concurrent transfers and analytics."""
+    print("🚀 Async CockroachDB Example")
+    print("=" * 50)
+
+    async with AsyncCockroachDBManager(dsn, key_scheme=key_scheme) as db_manager:
+        await db_manager.create_schema(updated_at_mode=updated_at_mode)
+        account_ids = await db_manager.create_sample_accounts(5)
+
+        bulk_deposits = {acc_id: Decimal(str(random.uniform(100, 500))).quantize(Decimal('0.01'))
+                         for acc_id in account_ids[:3]}
+        await db_manager.bulk_deposit(bulk_deposits)
+
+        # Independent transfers run concurrently on the pool
+        if len(account_ids) >= 2:
+            await asyncio.gather(*(
+                db_manager.enhanced_transfer_funds(account_ids[i], account_ids[(i + 1) % len(account_ids)],
+                                                   Decimal('10.00'), "Async demo transfer")
+                for i in range(len(account_ids))
+            ))
+
+        print("\n📊 Account Analytics:")
+        analytics = await db_manager.get_account_analytics()
+        stats = analytics['overall_stats']
+        print(f"Total Accounts: {stats['total_accounts']}")
+        print(f"Total Balance: ${stats['total_balance']:,.2f}")
+        print(f"Average Balance: ${stats['avg_balance']:,.2f}")
+        for name, elapsed in db_manager.last_query_timings.items():
+            logging.debug(f"  {name}: {elapsed * 1000:.1f}ms")
+
+        if account_ids:
+            print(f"\n📋 Recent Transactions for Account {account_ids[0]}:")
+            history = await db_manager.get_transaction_history(account_ids[0], 5)
+            for txn in history[:3]:
+                print(f"  {txn['direction'].title()}: ${txn['amount']} - {txn['description']}")
+
+        print("\n✅ Async features demonstrated successfully!")
+
+
+async def _run_async_transfer_load(db_manager: AsyncCockroachDBManager, account_ids: List, callers: int,
+                                   transfers_per_caller: int) -> Dict:
+    """Run random $1 transfers among *account_ids* from *callers* tasks and summarize them."""
+    latencies = []
+    failures = defaultdict(int)
+
+    async def transfer_caller():
+        rng = random.Random()
+        for _ in range(transfers_per_caller):
+            from_account_id, to_account_id = rng.sample(account_ids, 2)
+            start = time.perf_counter()
+            try:
+                await db_manager.enhanced_transfer_funds(from_account_id, to_account_id, Decimal('1.00'))
+                latencies.append(time.perf_counter() - start)
+            except Exception as e:
+                failures[type(e).__name__] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(transfer_caller() for _ in range(callers)))
+    elapsed = time.perf_counter() - start
+
+    txn_stats = db_manager.get_transaction_stats().get('transfer_operation', {})
+    return {
+        **latency_summary(latencies),
+        'throughput': len(latencies) / elapsed if elapsed > 0 else 0.0,
+        'retries': txn_stats.get('retries', 0),
+        'failures': dict(failures)
+    }
+
+
+async def benchmark_async_vs_threaded(dsn: str, callers: int = 500, transfers_per_caller: int = 10,
+                                      pool_size: int = 20, accounts: int = 1000, force: bool = False):
+    """Compare transfer throughput of the threaded and the async manager.
+
+    Both serve *callers* concurrent callers (threads or tasks) from a pool of
+    *pool_size* connections, transferring among the same *accounts* accounts
+    so contention stays low. Neither pool health-checks connections on
+    checkout. The schema is dropped again afterwards, so existing tables
+    are only dropped with *force* (see ``confirm_scratch_schema``).
+    """
+    print("⚖️  Concurrency Benchmark: threaded vs. async manager")
+    print(f"Callers: {callers}, Transfers/caller: {transfers_per_caller}, "
+          f"Pool size: {pool_size}, Accounts: {accounts}")
+    print("=" * 50)
+
+    # psycopg_pool does not check connections on checkout, so neither does the threaded pool
+    threaded_manager = CockroachDBManager(dsn, max_connections=pool_size, checkout_timeout=300.0,
+                                          health_check=False, max_retries=10)
+    if not confirm_scratch_schema(threaded_manager, force):
+        threaded_manager.close_all_connections()
+        return {}
+    try:
+        threaded_manager.cleanup_schema()
+        threaded_manager.create_schema()
+        account_ids = threaded_manager.create_sample_accounts(accounts)
+
+        results = {}
+        loop = asyncio.get_running_loop()
+        results['threaded'] = await loop.run_in_executor(
+            None, run_transfer_load, threaded_manager, account_ids, callers, transfers_per_caller)
+
+        async with AsyncCockroachDBManager(dsn, max_connections=pool_size, checkout_timeout=300.0,
+                                           max_retries=10) as async_manager:
+            results['async'] = await _run_async_transfer_load(
+                async_manager, account_ids, callers, transfers_per_caller)
+    finally:
+        threaded_manager.cleanup_schema()
+        threaded_manager.close_all_connections()
+
+    print_transfer_results('manager', results)
+    return results
+
+
+def main():
+    """Main function with command line argument parsing."""
+    parser = ArgumentParser(
+        description="""
+Async CockroachDB Example (psycopg 3)
+
+Usage Examples:
+  # Run the async demonstration
+  python async_example.py --demo
+
+  # Compare throughput with the threaded manager under 500 concurrent callers
+  python async_example.py --benchmark --bench-callers 500 --pool-size 20
+
+  # Connect to specific database
+  python async_example.py --demo "postgresql://root@host:26257/mydb?sslmode=disable"
+        """,
+        formatter_class=RawTextHelpFormatter
+    )
+
+    parser.add_argument("-v", "--verbose", action="store_true", help="Enable debug logging")
+    parser.add_argument("--demo", action="store_true", help="Run the async features demonstration")
+    parser.add_argument("--updated-at-mode", choices=UPDATED_AT_MODES, default='trigger',
+                       help="How accounts.updated_at is maintained (with --demo)")
+    parser.add_argument("--key-scheme", choices=KEY_SCHEMES, default='uuid',
+                       help="How account and transaction ids are generated (with --demo)")
+    parser.add_argument("--benchmark", action="store_true",
+                       help="Benchmark transfer throughput of the threaded vs. the async manager")
+    parser.add_argument("--force", action="store_true",
+                       help="Let --benchmark drop existing demo tables (use a scratch database instead)")
+    parser.add_argument("--bench-callers", type=int, default=500,
+                       help="Concurrent callers for --benchmark")
+    parser.add_argument("--bench-ops", type=int, default=10,
+                       help="Transfers per benchmark caller")
+    parser.add_argument("--pool-size", type=int, default=20,
+                       help="Connections in each manager's pool (with --benchmark)")
+    parser.add_argument("dsn", nargs="?", default=os.environ.get("DATABASE_URL"),
+                       help="Database connection string")
+
+    args = parser.parse_args()
+
+    if not args.dsn:
+        parser.error("Database connection string not provided")
+
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+
+    if args.benchmark:
+        asyncio.run(benchmark_async_vs_threaded(args.dsn, args.bench_callers, args.bench_ops, args.pool_size,
+                                               force=args.force))
+    elif args.demo:
+        asyncio.run(demonstrate_async_features(args.dsn, args.updated_at_mode, args.key_scheme))
+    else:
+        print("Run with --demo flag to see the async manager")
+        print("Run with --benchmark flag to compare it with the threaded manager")
+        print("Use enhanced_example.py --cleanup to remove all demo tables and views")
+
+
+if __name__ == "__main__":
+    main()
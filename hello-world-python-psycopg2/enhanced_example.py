@@ -4,33 +4,903 @@ Enhanced CockroachDB example with advanced database functionality.
 """
 
 import logging
+import json
 import os
 import random
+import re
+import threading
 import time
 import uuid
 from argparse import ArgumentParser, RawTextHelpFormatter
+from collections import OrderedDict, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
 from datetime import datetime, timedelta
 from decimal import Decimal
 from typing import List, Dict, Optional
 
 import psycopg2
-from psycopg2.errors import SerializationFailure
+from psycopg2.errors import SerializationFailure, StatementCompletionUnknown
 import psycopg2.extras
 from psycopg2 import pool
 
 
+# Independent queries behind get_account_analytics: name -> (sql, fetch_one)
+ANALYTICS_QUERIES = {
+    # Overall statistics
+    'overall_stats': ("""
+        SELECT 
+            COUNT(*) as total_accounts,
+            SUM(balance) as total_balance,
+            AVG(balance) as avg_balance,
+            MIN(balance) as min_balance,
+            MAX(balance) as max_balance,
+            PERCENTILE_DISC(0.5) WITHIN GROUP (ORDER BY balance) as median_balance
+        FROM accounts 
+        WHERE is_active = TRUE
+    """, True),
+    # Account distribution by type
+    'type_distribution': ("""
+        SELECT 
+            account_type,
+            COUNT(*) as count,
+            SUM(balance) as total_balance,
+            AVG(balance) as avg_balance
+        FROM accounts 
+        WHERE is_active = TRUE
+        GROUP BY account_type
+        ORDER BY count DESC
+    """, False),
+    # Recent transaction activity
+    'recent_activity': ("""
+        SELECT 
+            DATE_TRUNC('day', created_at) as date,
+            transaction_type,
+            COUNT(*) as count,
+            SUM(amount) as total_amount
+        FROM transactions 
+        WHERE created_at >= NOW() - INTERVAL '30 days'
+        GROUP BY DATE_TRUNC('day', created_at), transaction_type
+        ORDER BY date DESC, transaction_type
+    """, False),
+    # Top accounts by balance
+    'top_accounts': ("""
+        SELECT 
+            account_number,
+            owner_name,
+            account_type,
+            balance,
+            ROW_NUMBER() OVER (ORDER BY balance DESC) as rank
+        FROM accounts 
+        WHERE is_active = TRUE
+        ORDER BY balance DESC
+        LIMIT 10
+    """, False),
+}
+
+
+# Body of the account_summaries materialized view
+ACCOUNT_SUMMARIES_QUERY = """
+    SELECT 
+        a.id,
+        a.account_number,
+        a.owner_name,
+        a.account_type,
+        a.balance,
+        COUNT(t.id) as transaction_count,
+        COALESCE(SUM(CASE WHEN t.from_account_id = a.id THEN -t.amount ELSE t.amount END), 0) as total_transaction_volume
+    FROM accounts a
+    LEFT JOIN transactions t ON (a.id = t.from_account_id OR a.id = t.to_account_id)
+    WHERE a.is_active = TRUE
+    GROUP BY a.id, a.account_number, a.owner_name, a.account_type, a.balance
+"""
+
+# Used by get_transaction_history; parameters: account id four times, then the limit
+TRANSACTION_HISTORY_QUERY = """
+    SELECT 
+        t.id,
+        t.transaction_type,
+        t.amount,
+        t.description,
+        t.created_at,
+        t.status,
+        CASE 
+            WHEN t.from_account_id = %s THEN 'outgoing'
+            WHEN t.to_account_id = %s THEN 'incoming'
+            ELSE 'other'
+        END as direction,
+        from_acc.account_number as from_account,
+        from_acc.owner_name as from_owner,
+        to_acc.account_number as to_account,
+        to_acc.owner_name as to_owner
+    FROM transactions t
+    LEFT JOIN accounts from_acc ON t.from_account_id = from_acc.id
+    LEFT JOIN accounts to_acc ON t.to_account_id = to_acc.id
+    WHERE t.from_account_id = %s OR t.to_account_id = %s
+    ORDER BY t.created_at DESC
+    LIMIT %s
+"""
+
+# Index shapes that serve the hot queries without full scans or index joins
+ACTIVE_BALANCE_INDEX = (
+    "CREATE INDEX IF NOT EXISTS idx_accounts_active_balance ON accounts (is_active, balance DESC) "
+    "STORING (account_number, owner_name, account_type)"
+)
+TRANSACTION_PARTY_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_transactions_from_created ON transactions (from_account_id, created_at DESC) "
+    "STORING (to_account_id, amount, transaction_type, description, status)",
+    "CREATE INDEX IF NOT EXISTS idx_transactions_to_created ON transactions (to_account_id, created_at DESC) "
+    "STORING (from_account_id, amount, transaction_type, description, status)"
+]
+
+# Queries checked by run_diagnostics: name -> sql, a function building parameters
+# from a representative account id, and the indexes suggested for them
+DIAGNOSTIC_QUERIES = {
+    **{
+        name: {'sql': sql, 'params': lambda account_id: None, 'indexes': [ACTIVE_BALANCE_INDEX]}
+        for name, (sql, _) in ANALYTICS_QUERIES.items() if name != 'recent_activity'
+    },
+    'recent_activity': {
+        'sql': ANALYTICS_QUERIES['recent_activity'][0],
+        'params': lambda account_id: None,
+        # Hash-sharded like idx_created_at, so inserts do not all land in the newest range
+        'indexes': [
+            "CREATE INDEX IF NOT EXISTS idx_transactions_created_storing ON transactions (created_at) "
+            "USING HASH STORING (transaction_type, amount)"
+        ]
+    },
+    'transaction_history': {
+        'sql': TRANSACTION_HISTORY_QUERY,
+        'params': lambda account_id: (account_id, account_id, account_id, account_id, 50),
+        'indexes': TRANSACTION_PARTY_INDEXES
+    },
+    'account_summaries': {
+        'sql': ACCOUNT_SUMMARIES_QUERY,
+        'params': lambda account_id: None,
+        'indexes': [ACTIVE_BALANCE_INDEX] + TRANSACTION_PARTY_INDEXES,
+        'note': "The OR join cannot use a single index; splitting it into a UNION ALL of "
+                "from/to joins lets each side use its own index"
+    },
+}
+
+# Execution statistics pulled out of EXPLAIN ANALYZE output
+EXPLAIN_STATISTICS = {
+    'execution_time': re.compile(r'execution time: (.+)'),
+    'rows_read_from_kv': re.compile(r'rows (?:read|decoded) from KV: ([\d,]+)'),
+    'kv_bytes_read': re.compile(r'rows (?:read|decoded) from KV: [\d,]+ \(([^,)]+)'),
+    'contention_time': re.compile(r'cumulative time spent due to contention: (.+)'),
+    'max_memory': re.compile(r'maximum memory usage: (.+)')
+}
+
+
+# How accounts.updated_at is maintained: a per-row plpgsql trigger, or the
+# column's own ON UPDATE NOW() expression, which avoids running a function per write
+UPDATED_AT_MODES = ('trigger', 'on-update')
+
+
+# Primary key strategies for accounts and transactions. 'sequential' uses
+# time-ordered unique_rowid() keys, which funnel inserts into the last range;
+# the others spread them: random UUIDs, hash-sharded keys, or bit-reversed
+# unordered_unique_rowid() keys
+KEY_SCHEMES = ('sequential', 'uuid', 'hash-sharded', 'bit-reversed')
+
+
+def key_type(key_scheme: str) -> str:
+    """SQL type of the id columns under *key_scheme*."""
+    return 'UUID' if key_scheme == 'uuid' else 'INT8'
+
+
+def _id_column(key_scheme: str) -> str:
+    """Definition of a generated ``id`` primary key column under *key_scheme*."""
+    if key_scheme == 'uuid':
+        return "id UUID PRIMARY KEY DEFAULT gen_random_uuid()"
+    if key_scheme == 'hash-sharded':
+        return "id INT8 NOT NULL DEFAULT unique_rowid(),\n                PRIMARY KEY (id) USING HASH"
+    if key_scheme == 'bit-reversed':
+        return "id INT8 PRIMARY KEY DEFAULT unordered_unique_rowid()"
+    return "id INT8 PRIMARY KEY DEFAULT unique_rowid()"
+
+
+def schema_statements(updated_at_mode: str = 'trigger', key_scheme: str = 'uuid') -> List[str]:
+    """DDL for the enhanced schema, in execution order."""
+    if updated_at_mode not in UPDATED_AT_MODES:
+        raise ValueError(f"updated_at_mode must be one of {UPDATED_AT_MODES}")
+    if key_scheme not in KEY_SCHEMES:
+        raise ValueError(f"key_scheme must be one of {KEY_SCHEMES}")
+    on_update = " ON UPDATE NOW()" if updated_at_mode == 'on-update' else ""
+    id_column = _id_column(key_scheme)
+    id_type = key_type(key_scheme)
+    # Only the sequential scheme keeps the hot, time-ordered accounts index
+    created_at_sharding = "" if key_scheme == 'sequential' else " USING HASH"
+    
+    statements = [
+        # Accounts table with additional fields
+        f"""
+            CREATE TABLE IF NOT EXISTS accounts (
+                {id_column},
+                account_number STRING UNIQUE NOT NULL,
+                owner_name STRING NOT NULL,
+                account_type STRING NOT NULL CHECK (account_type IN ('checking', 'savings', 'business')),
+                balance DECIMAL(15,2) NOT NULL DEFAULT 0.00,
+                created_at TIMESTAMPTZ DEFAULT NOW(),
+                updated_at TIMESTAMPTZ DEFAULT NOW(){on_update},
+                is_active BOOLEAN DEFAULT TRUE,
+                INDEX idx_account_number (account_number),
+                INDEX idx_owner_name (owner_name),
+                INDEX idx_created_at (created_at){created_at_sharding}
+            )
+        """,
+        # Transaction history table. The created_at index is hash-sharded so
+        # time-ordered inserts spread over several ranges instead of one
+        f"""
+            CREATE TABLE IF NOT EXISTS transactions (
+                {id_column},
+                from_account_id {id_type} REFERENCES accounts(id),
+                to_account_id {id_type} REFERENCES accounts(id),
+                amount DECIMAL(15,2) NOT NULL,
+                transaction_type STRING NOT NULL CHECK (transaction_type IN ('transfer', 'deposit', 'withdrawal')),
+                description STRING,
+                created_at TIMESTAMPTZ DEFAULT NOW(),
+                status STRING DEFAULT 'completed' CHECK (status IN ('pending', 'completed', 'failed', 'reversed')),
+                INDEX idx_from_account (from_account_id),
+                INDEX idx_to_account (to_account_id),
+                INDEX idx_created_at (created_at) USING HASH,
+                INDEX idx_status (status)
+            )
+        """,
+        # Archive for transactions moved out by archive_transactions; no foreign
+        # keys, so archived history never blocks changes to accounts
+        f"""
+            CREATE TABLE IF NOT EXISTS transactions_archive (
+                id {id_type} PRIMARY KEY,
+                from_account_id {id_type},
+                to_account_id {id_type},
+                amount DECIMAL(15,2) NOT NULL,
+                transaction_type STRING NOT NULL,
+                description STRING,
+                created_at TIMESTAMPTZ,
+                status STRING,
+                archived_at TIMESTAMPTZ DEFAULT NOW(),
+                INDEX idx_archive_created_at (created_at) USING HASH
+            )
+        """,
+        # Account summaries materialized view
+        f"CREATE MATERIALIZED VIEW IF NOT EXISTS account_summaries AS {ACCOUNT_SUMMARIES_QUERY}"
+    ]
+    
+    if updated_at_mode == 'trigger':
+        # Trigger to update account updated_at timestamp
+        statements += [
+            """
+                CREATE OR REPLACE FUNCTION update_account_timestamp()
+                RETURNS TRIGGER AS $$
+                BEGIN
+                    NEW.updated_at = NOW();
+                    RETURN NEW;
+                END;
+                $$ LANGUAGE plpgsql;
+            """,
+            """
+                DROP TRIGGER IF EXISTS account_update_trigger ON accounts;
+                CREATE TRIGGER account_update_trigger
+                    BEFORE UPDATE ON accounts
+                    FOR EACH ROW
+                    EXECUTE FUNCTION update_account_timestamp();
+            """
+        ]
+    return statements
+
+
+class AmbiguousCommitError(Exception):
+    """The commit may or may not have been applied (40003 or connection loss at commit)."""
+
+
+def _is_ambiguous_commit_error(error: psycopg2.Error) -> bool:
+    """Whether *error*, raised while committing, leaves the outcome unknown."""
+    if isinstance(error, StatementCompletionUnknown):
+        return True
+    if isinstance(error, SerializationFailure):
+        return False
+    # Connection loss surfaces without a SQLSTATE
+    return isinstance(error, (psycopg2.OperationalError, psycopg2.InterfaceError)) and error.pgcode is None
+
+
+def latency_summary(latencies: List[float]) -> Dict:
+    """Mean and tail percentiles, in milliseconds, of latencies given in seconds."""
+    if not latencies:
+        return {'count': 0, 'mean': 0.0, 'p50': 0.0, 'p95': 0.0, 'p99': 0.0, 'max': 0.0}
+    ordered = sorted(latencies)
+
+    def percentile(fraction):
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000
+
+    return {
+        'count': len(ordered),
+        'mean': sum(ordered) / len(ordered) * 1000,
+        'p50': percentile(0.50),
+        'p95': percentile(0.95),
+        'p99': percentile(0.99),
+        'max': ordered[-1] * 1000
+    }
+
+
+# Upper bounds (ms) of the latency histogram buckets kept by TransactionStats
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, float('inf'))
+
+# Statements executed on this thread while run_transaction is capturing them
+_statement_capture = threading.local()
+
+
+class StatementRecordingCursor(psycopg2.extras.RealDictCursor):
+    """RealDictCursor that records executed SQL while a capture is active."""
+
+    def execute(self, query, vars=None):
+        result = super().execute(query, vars)
+        statements = getattr(_statement_capture, 'statements', None)
+        if statements is not None and self.query is not None:
+            statements.append(self.query.decode(errors='replace'))
+        return result
+
+
+class TransactionInstrumentation:
+    """Hooks called by run_transaction; override the ones you need.
+
+    *name* identifies the operation (by default the operation function's name).
+    Latencies are in seconds, *sqlstate* is the error's SQLSTATE code.
+    """
+
+    # Set to True to receive the statement list of the final attempt in on_commit
+    captures_statements = False
+
+    def on_attempt(self, name: str, attempt: int):
+        pass
+
+    def on_retry(self, name: str, attempt: int, sqlstate: Optional[str], backoff: float):
+        pass
+
+    def on_commit(self, name: str, attempts: int, latency: float, attempt_latency: float,
+                  statements: Optional[List[str]] = None):
+        pass
+
+    def on_failure(self, name: str, attempts: int, latency: float, sqlstate: Optional[str]):
+        pass
+
+
+class TransactionStats(TransactionInstrumentation):
+    """In-memory aggregation of transaction attempts, retries and latency.
+
+    ``latency`` covers the whole call including retries and backoff, while
+    ``attempt_latency`` only covers the attempt that committed, so the gap
+    between the two is the cost of contention. With *slow_threshold* set
+    (seconds) the statements of slower transactions are kept in ``slow_log``.
+    """
+
+    def __init__(self, slow_threshold: Optional[float] = None, slow_log_size: int = 100):
+        self.slow_threshold = slow_threshold
+        self.captures_statements = slow_threshold is not None
+        self.slow_log = deque(maxlen=slow_log_size)
+        self._lock = threading.Lock()
+        self._operations = defaultdict(self._new_operation)
+
+    @staticmethod
+    def _new_operation() -> Dict:
+        return {
+            'transactions': 0,
+            'committed': 0,
+            'failed': 0,
+            'attempts': 0,
+            'retries': 0,
+            'retry_reasons': defaultdict(int),
+            'failure_reasons': defaultdict(int),
+            'backoff_time': 0.0,
+            'latency_histogram': [0] * len(LATENCY_BUCKETS_MS),
+            'attempt_latency_histogram': [0] * len(LATENCY_BUCKETS_MS)
+        }
+
+    @staticmethod
+    def _bucket(latency: float) -> int:
+        latency_ms = latency * 1000
+        for index, bound in enumerate(LATENCY_BUCKETS_MS):
+            if latency_ms <= bound:
+                return index
+        return len(LATENCY_BUCKETS_MS) - 1
+
+    def on_attempt(self, name, attempt):
+        with self._lock:
+            self._operations[name]['attempts'] += 1
+
+    def on_retry(self, name, attempt, sqlstate, backoff):
+        with self._lock:
+            stats = self._operations[name]
+            stats['retries'] += 1
+            stats['retry_reasons'][sqlstate or 'unknown'] += 1
+            stats['backoff_time'] += backoff
+
+    def on_commit(self, name, attempts, latency, attempt_latency, statements=None):
+        with self._lock:
+            stats = self._operations[name]
+            stats['transactions'] += 1
+            stats['committed'] += 1
+            stats['latency_histogram'][self._bucket(latency)] += 1
+            stats['attempt_latency_histogram'][self._bucket(attempt_latency)] += 1
+            if self.slow_threshold is not None and latency >= self.slow_threshold:
+                self.slow_log.append({
+                    'name': name,
+                    'latency': latency,
+                    'attempts': attempts,
+                    'statements': list(statements or []),
+                    'recorded_at': datetime.now()
+                })
+
+    def on_failure(self, name, attempts, latency, sqlstate):
+        with self._lock:
+            stats = self._operations[name]
+            stats['transactions'] += 1
+            stats['failed'] += 1
+            stats['failure_reasons'][sqlstate or 'unknown'] += 1
+
+    def snapshot(self) -> Dict:
+        """Copy of the per-operation statistics."""
+        with self._lock:
+            return {
+                name: {
+                    **stats,
+                    'retry_reasons': dict(stats['retry_reasons']),
+                    'failure_reasons': dict(stats['failure_reasons']),
+                    'latency_histogram': list(stats['latency_histogram']),
+                    'attempt_latency_histogram': list(stats['attempt_latency_histogram'])
+                }
+                for name, stats in self._operations.items()
+            }
+
+
+class ManagedConnectionPool(pool.ThreadedConnectionPool):
+    """Threaded connection pool with blocking checkout, health checks and metrics.
+
+    ``getconn`` waits up to *checkout_timeout* seconds for a free connection
+    instead of raising as soon as the pool is exhausted. Checked-out connections
+    are verified first, so ones broken by a node drain are replaced, and
+    connections older than *max_lifetime* are retired so that new ones can land
+    on nodes added after a scale-up.
+    """
+
+    def __init__(self, minconn, maxconn, *args, checkout_timeout: float = 30.0,
+                 max_lifetime: Optional[float] = 1800.0, health_check: bool = True, **kwargs):
+        self.checkout_timeout = checkout_timeout
+        self.max_lifetime = max_lifetime
+        self.health_check = health_check
+        self._available = threading.Condition()
+        self._created_at = {}
+        self._checked_out_at = {}
+        self._metrics_lock = threading.Lock()
+        self._metrics = {
+            'checkouts': 0,
+            'checkout_timeouts': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0,
+            'checkout_time_total': 0.0,
+            'checkout_time_max': 0.0,
+            'discarded_unhealthy': 0,
+            'discarded_expired': 0
+        }
+        super().__init__(minconn, maxconn, *args, **kwargs)
+
+    def _connect(self, key=None):
+        conn = super()._connect(key)
+        self._created_at[id(conn)] = time.monotonic()
+        return conn
+
+    def getconn(self, key=None, timeout: Optional[float] = None):
+        """Check out a healthy connection, waiting up to *timeout* seconds.
+
+        *timeout* defaults to ``checkout_timeout``; pass ``0`` to fail
+        immediately with ``PoolError`` when no connection is free.
+        """
+        timeout = self.checkout_timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+
+        while True:
+            with self._available:
+                while not self.closed and len(self._used) >= self.maxconn:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        with self._metrics_lock:
+                            self._metrics['checkout_timeouts'] += 1
+                        raise pool.PoolError(
+                            f"connection pool exhausted: no connection free after {timeout:.1f}s")
+                    self._available.wait(remaining)
+                conn = super().getconn(key)
+
+            reason = self._check_connection(conn, start)
+            if reason is None:
+                break
+            logging.debug(f"Discarding pooled connection ({reason})")
+            with self._metrics_lock:
+                self._metrics[f'discarded_{reason}'] += 1
+            self._discard(conn, key)
+
+        wait_time = time.monotonic() - start
+        self._checked_out_at[id(conn)] = time.monotonic()
+        with self._metrics_lock:
+            self._metrics['checkouts'] += 1
+            self._metrics['wait_time_total'] += wait_time
+            self._metrics['wait_time_max'] = max(self._metrics['wait_time_max'], wait_time)
+        return conn
+
+    def putconn(self, conn=None, key=None, close=False):
+        checked_out_at = self._checked_out_at.pop(id(conn), None)
+        if checked_out_at is not None:
+            checkout_time = time.monotonic() - checked_out_at
+            with self._metrics_lock:
+                self._metrics['checkout_time_total'] += checkout_time
+                self._metrics['checkout_time_max'] = max(self._metrics['checkout_time_max'], checkout_time)
+
+        close = close or self._is_expired(conn)
+        with self._available:
+            super().putconn(conn, key, close)
+            self._available.notify()
+        if conn.closed:
+            # Closed on purpose, or because the pool already holds minconn idle
+            self._created_at.pop(id(conn), None)
+
+    def _is_expired(self, conn) -> bool:
+        if self.max_lifetime is None:
+            return False
+        created_at = self._created_at.get(id(conn))
+        return created_at is not None and time.monotonic() - created_at > self.max_lifetime
+
+    def _check_connection(self, conn, checkout_started: float) -> Optional[str]:
+        """Return why *conn* must not be handed out, or None if it is usable."""
+        # Connections opened during this checkout are never retired straight away
+        if self._created_at.get(id(conn), checkout_started) < checkout_started and self._is_expired(conn):
+            return 'expired'
+        if conn.closed:
+            return 'unhealthy'
+        if self.health_check:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1")
+                conn.rollback()
+            except psycopg2.Error:
+                return 'unhealthy'
+        return None
+
+    def _discard(self, conn, key=None):
+        with self._available:
+            super().putconn(conn, key, close=True)
+            self._available.notify()
+        self._created_at.pop(id(conn), None)
+
+    def get_metrics(self) -> Dict:
+        """Snapshot of pool utilization, wait time and checkout duration."""
+        with self._available:
+            in_use = len(self._used)
+            idle = len(self._pool)
+        with self._metrics_lock:
+            metrics = dict(self._metrics)
+        checkouts = metrics['checkouts']
+        metrics.update({
+            'max_connections': self.maxconn,
+            'live_connections': in_use + idle,
+            'in_use_connections': in_use,
+            'idle_connections': idle,
+            'utilization': in_use / self.maxconn,
+            'wait_time_avg': metrics['wait_time_total'] / checkouts if checkouts else 0.0,
+            'checkout_time_avg': metrics['checkout_time_total'] / checkouts if checkouts else 0.0
+        })
+        return metrics
+
+
+# Escapes of PostgreSQL's COPY text format, in which changefeed rows arrive
+COPY_ESCAPES = {'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t', 'v': '\v'}
+COPY_ESCAPE = re.compile(r'\\(.)')
+
+
+def _unescape_copy_field(field: str) -> Optional[str]:
+    if field == '\\N':
+        return None
+    return COPY_ESCAPE.sub(lambda match: COPY_ESCAPES.get(match.group(1), match.group(1)), field)
+
+
+def _hlc_wall_time(timestamp: Decimal) -> float:
+    """Wall time in seconds of an HLC timestamp such as 1700000000123456789.0000000001."""
+    return int(timestamp) / 1e9
+
+
+class _ChangefeedStream:
+    """File-like target for ``copy_expert`` that hands complete lines to *on_line*."""
+
+    def __init__(self, on_line):
+        self.on_line = on_line
+        self._buffer = ''
+
+    def write(self, data):
+        if isinstance(data, bytes):
+            data = data.decode()
+        *lines, self._buffer = (self._buffer + data).split('\n')
+        for line in lines:
+            if line:
+                self.on_line(line)
+        return len(data)
+
+
+# Cache entry for a row changed at a known timestamp but not yet seen again
+_PENDING_WRITE = object()
+
+# Account row plus the MVCC timestamp of its version and the time it was read
+CACHED_ACCOUNT_COLUMNS = ("*, crdb_internal_mvcc_timestamp AS mvcc_timestamp, "
+                          "cluster_logical_timestamp() AS read_timestamp")
+
+
+class AccountCache:
+    """Bounded LRU of account rows kept fresh by a sinkless changefeed.
+
+    A background thread streams ``EXPERIMENTAL CHANGEFEED FOR accounts`` over a
+    dedicated connection and applies every change, keeping the version with
+    the newest MVCC timestamp and evicting the least recently used rows
+    beyond *capacity*. Resolved timestamps tell how far behind the cache may
+    be: ``get`` only answers while that lag is within the caller's bound.
+    After a failure the changefeed resumes from the last resolved timestamp.
+    """
+
+    def __init__(self, dsn: str, capacity: int = 10000, resolved_interval: str = '1s'):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.dsn = dsn
+        self.capacity = capacity
+        self.resolved_interval = resolved_interval
+        self.last_error = None
+        # account id (as str) -> (mvcc timestamp, row, None once deleted, or _PENDING_WRITE)
+        self._rows = OrderedDict()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._conn = None
+        self._resolved = None
+        self._received = False
+        # Bumped whenever rows leave the cache; see admit()
+        self.generation = 0
+        self._metrics = {
+            'hits': 0,
+            'misses': 0,
+            'lagging': 0,
+            'events': 0,
+            'resolved_timestamps': 0,
+            'evictions': 0,
+            'restarts': 0
+        }
+
+    def start(self):
+        """Start consuming the changefeed in a daemon thread."""
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._consume, name="account-cache-changefeed", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """Cancel the changefeed and wait for the consumer thread to exit."""
+        self._stop.set()
+        conn = self._conn
+        if conn is not None and not conn.closed:
+            conn.cancel()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _consume(self):
+        backoff = 0.5
+        while not self._stop.is_set():
+            self._received = False
+            options = f"updated, resolved='{self.resolved_interval}'"
+            if self._resolved is not None:
+                # Resume where the last changefeed left off instead of rescanning
+                options += f", cursor='{self._resolved}'"
+            try:
+                self._conn = psycopg2.connect(self.dsn, application_name="enhanced_crdb_example_cache")
+                # Changefeeds cannot run inside an explicit transaction
+                self._conn.autocommit = True
+                with self._conn.cursor() as cur:
+                    cur.copy_expert(f"COPY (EXPERIMENTAL CHANGEFEED FOR accounts WITH {options}) TO STDOUT",
+                                    _ChangefeedStream(self._apply))
+                self.last_error = "changefeed ended"
+            except psycopg2.Error as e:
+                if self._stop.is_set():
+                    break
+                self.last_error = str(e).strip()
+                logging.warning(f"Account cache changefeed failed: {self.last_error} "
+                                "(is kv.rangefeed.enabled set?)")
+            finally:
+                if self._conn is not None:
+                    self._conn.close()
+                    self._conn = None
+
+            if self._received:
+                backoff = 0.5
+            elif self._resolved is not None:
+                # The cursor itself may be the problem (e.g. older than the GC
+                # TTL), so start over with a fresh initial scan
+                self.clear()
+            with self._lock:
+                self._metrics['restarts'] += 1
+            self._stop.wait(backoff)
+            backoff = min(backoff * 2, 30.0)
+
+    def _apply(self, line: str):
+        table, key, value = (_unescape_copy_field(field) for field in line.split('\t'))
+        message = json.loads(value, parse_float=Decimal)
+        self._received = True
+        if 'resolved' in message:
+            with self._lock:
+                self._resolved = Decimal(message['resolved'])
+                self._metrics['resolved_timestamps'] += 1
+            return
+        row = message.get('after')
+        if row is not None:
+            row = self._decode_row(row)
+        with self._lock:
+            self._metrics['events'] += 1
+        # id is the last primary key column; hash-sharded keys are [shard, id]
+        account_id = row['id'] if row is not None and 'id' in row else json.loads(key)[-1]
+        self._store(account_id, Decimal(message['updated']), row)
+
+    @staticmethod
+    def _decode_row(row: Dict) -> Dict:
+        """Give changefeed JSON values the types psycopg2 returns for the same columns."""
+        if isinstance(row.get('id'), str):
+            row['id'] = uuid.UUID(row['id'])
+        for column in ('created_at', 'updated_at'):
+            if isinstance(row.get(column), str):
+                try:
+                    row[column] = datetime.fromisoformat(row[column])
+                except ValueError:
+                    pass
+        return row
+
+    def _store(self, account_id, timestamp: Decimal, row, read_timestamp: Optional[Decimal] = None):
+        key = str(account_id)
+        with self._lock:
+            current = self._rows.get(key)
+            if current is not None:
+                # The version written at a marker's timestamp, or any version
+                # read at or after it, replaces the marker
+                if current[1] is _PENDING_WRITE and current[0] > timestamp and \
+                        (read_timestamp is None or read_timestamp < current[0]):
+                    return
+                if current[1] is not _PENDING_WRITE and current[0] >= timestamp:
+                    return
+            self._rows[key] = (timestamp, row)
+            self._rows.move_to_end(key)
+            while len(self._rows) > self.capacity:
+                self._rows.popitem(last=False)
+                self._metrics['evictions'] += 1
+                self.generation += 1
+
+    def lag(self) -> Optional[float]:
+        """Seconds the cache may be behind the database, or None before the first resolved timestamp."""
+        resolved = self._resolved
+        if resolved is None:
+            return None
+        return max(0.0, time.time() - _hlc_wall_time(resolved))
+
+    def get(self, account_id, max_staleness: float):
+        """Return ``(True, row)`` on a hit, ``(False, None)`` when the database must be asked.
+
+        A hit needs the row cached and the changefeed no more than
+        *max_staleness* seconds behind. The row is None for deleted accounts.
+        """
+        key = str(account_id)
+        lag = self.lag()
+        with self._lock:
+            if lag is None or lag > max_staleness:
+                self._metrics['lagging'] += 1
+                return False, None
+            entry = self._rows.get(key)
+            if entry is None or entry[1] is _PENDING_WRITE:
+                self._metrics['misses'] += 1
+                return False, None
+            self._rows.move_to_end(key)
+            self._metrics['hits'] += 1
+            return True, entry[1]
+
+    def admit(self, account_id, timestamp: Decimal, row: Dict, generation: int,
+              read_timestamp: Optional[Decimal] = None):
+        """Cache a row with MVCC *timestamp* read from the database at *read_timestamp*.
+
+        *generation* is the value of ``generation`` before the read. If rows
+        left the cache since then, a change newer than the read may have been
+        dropped with them, so the row is only merged into an existing entry.
+        A read at or after an ``invalidate`` marker's timestamp replaces it.
+        """
+        key = str(account_id)
+        with self._lock:
+            if generation != self.generation and key not in self._rows:
+                return
+        self._store(account_id, timestamp, row, read_timestamp)
+
+    def invalidate(self, account_ids, timestamp: Decimal):
+        """Mark rows changed in a transaction committed at *timestamp*.
+
+        Until a version at least that new arrives from the changefeed, or a
+        database read at or after *timestamp* is admitted, lookups miss and
+        older changefeed events are ignored.
+        """
+        for account_id in account_ids:
+            self._store(account_id, timestamp, _PENDING_WRITE)
+
+    def discard(self, account_ids):
+        """Drop cached rows, e.g. when their latest version could not be read."""
+        with self._lock:
+            for account_id in account_ids:
+                if self._rows.pop(str(account_id), None) is not None:
+                    self.generation += 1
+
+    def clear(self):
+        with self._lock:
+            self._rows.clear()
+            self._resolved = None
+            self.generation += 1
+
+    def metrics(self) -> Dict:
+        """Hit rate, changefeed lag and event counters."""
+        lag = self.lag()
+        with self._lock:
+            metrics = dict(self._metrics)
+            entries = len(self._rows)
+        lookups = metrics['hits'] + metrics['misses'] + metrics['lagging']
+        metrics.update({
+            'capacity': self.capacity,
+            'entries': entries,
+            'hit_rate': metrics['hits'] / lookups if lookups else 0.0,
+            'changefeed_lag': lag,
+            'running': self._thread is not None and self._thread.is_alive(),
+            'last_error': self.last_error
+        })
+        return metrics
+
+
+# How run_transaction retries: 'rollback' restarts from scratch after a full
+# rollback, 'savepoint' follows CockroachDB's SAVEPOINT cockroach_restart protocol
+RETRY_MODES = ('rollback', 'savepoint')
+
+
 class CockroachDBManager:
     """Enhanced CockroachDB manager with connection pooling and advanced features."""
     
-    def __init__(self, dsn: str, min_connections: int = 2, max_connections: int = 10):
+    def __init__(self, dsn: str, min_connections: int = 2, max_connections: int = 10,
+                 checkout_timeout: float = 30.0, max_connection_lifetime: Optional[float] = 1800.0,
+                 health_check: bool = True,
+                 instrumentation: Optional[TransactionInstrumentation] = None,
+                 retry_mode: str = 'rollback', max_retries: int = 3,
+                 retry_backoff_base: float = 0.05, retry_backoff_cap: float = 2.0,
+                 key_scheme: str = 'uuid', account_cache_size: Optional[int] = None,
+                 cache_max_staleness: float = 5.0):
+        if retry_mode not in RETRY_MODES:
+            raise ValueError(f"retry_mode must be one of {RETRY_MODES}")
+        if key_scheme not in KEY_SCHEMES:
+            raise ValueError(f"key_scheme must be one of {KEY_SCHEMES}")
         self.dsn = dsn
-        self.connection_pool = psycopg2.pool.ThreadedConnectionPool(
+        self.key_scheme = key_scheme
+        self.key_type = key_type(key_scheme)
+        self.retry_mode = retry_mode
+        self.max_retries = max_retries
+        self.retry_backoff_base = retry_backoff_base
+        self.retry_backoff_cap = retry_backoff_cap
+        self.instrumentation = instrumentation or TransactionStats()
+        self.connection_pool = ManagedConnectionPool(
             min_connections, max_connections, dsn,
+            checkout_timeout=checkout_timeout,
+            max_lifetime=max_connection_lifetime,
+            health_check=health_check,
             application_name="enhanced_crdb_example",
-            cursor_factory=psycopg2.extras.RealDictCursor
+            cursor_factory=StatementRecordingCursor
         )
         psycopg2.extras.register_uuid()
+        self.last_query_timings = {}
+        # Opt-in read cache for get_account, fed by a changefeed on accounts
+        self.cache_max_staleness = cache_max_staleness
+        self.account_cache = None
+        if account_cache_size:
+            self.enable_account_cache(account_cache_size)
     
     @contextmanager
     def get_connection(self):
@@ -41,88 +911,57 @@ class CockroachDBManager:
         finally:
             self.connection_pool.putconn(conn)
     
+    def get_pool_metrics(self) -> Dict:
+        """Connection pool wait time, checkout time and live/idle counts."""
+        return self.connection_pool.get_metrics()
+
+    def enable_account_cache(self, capacity: int = 10000):
+        """Start caching up to *capacity* account rows for ``get_account``.
+
+        The accounts table must exist and rangefeeds must be enabled
+        (``SET CLUSTER SETTING kv.rangefeed.enabled = true``).
+        """
+        if self.account_cache is None:
+            self.account_cache = AccountCache(self.dsn, capacity)
+            self.account_cache.start()
+
+    def get_cache_metrics(self) -> Optional[Dict]:
+        """Account cache hit rate and changefeed lag, or None without a cache."""
+        return self.account_cache.metrics() if self.account_cache else None
+
     def close_all_connections(self):
-        """Close all connections in the pool."""
+        """Stop the account cache and close all connections in the pool."""
+        if self.account_cache:
+            self.account_cache.stop()
         self.connection_pool.closeall()
 
-    def create_schema(self):
-        """Create enhanced database schema with multiple tables."""
+    def create_schema(self, updated_at_mode: str = 'trigger', key_scheme: Optional[str] = None):
+        """Create enhanced database schema with multiple tables.
+
+        *updated_at_mode* picks how ``accounts.updated_at`` is maintained and
+        *key_scheme* (default: the manager's) how ids are generated; see
+        ``schema_statements``.
+        """
         with self.get_connection() as conn:
             with conn.cursor() as cur:
-                # Accounts table with additional fields
-                cur.execute("""
-                    CREATE TABLE IF NOT EXISTS accounts (
-                        id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
-                        account_number STRING UNIQUE NOT NULL,
-                        owner_name STRING NOT NULL,
-                        account_type STRING NOT NULL CHECK (account_type IN ('checking', 'savings', 'business')),
-                        balance DECIMAL(15,2) NOT NULL DEFAULT 0.00,
-                        created_at TIMESTAMPTZ DEFAULT NOW(),
-                        updated_at TIMESTAMPTZ DEFAULT NOW(),
-                        is_active BOOLEAN DEFAULT TRUE,
-                        INDEX idx_account_number (account_number),
-                        INDEX idx_owner_name (owner_name),
-                        INDEX idx_created_at (created_at)
-                    )
-                """)
-                
-                # Transaction history table
-                cur.execute("""
-                    CREATE TABLE IF NOT EXISTS transactions (
-                        id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
-                        from_account_id UUID REFERENCES accounts(id),
-                        to_account_id UUID REFERENCES accounts(id),
-                        amount DECIMAL(15,2) NOT NULL,
-                        transaction_type STRING NOT NULL CHECK (transaction_type IN ('transfer', 'deposit', 'withdrawal')),
-                        description STRING,
-                        created_at TIMESTAMPTZ DEFAULT NOW(),
-                        status STRING DEFAULT 'completed' CHECK (status IN ('pending', 'completed', 'failed', 'reversed')),
-                        INDEX idx_from_account (from_account_id),
-                        INDEX idx_to_account (to_account_id),
-                        INDEX idx_created_at (created_at),
-                        INDEX idx_status (status)
-                    )
-                """)
-                
-                # Account summaries materialized view
-                cur.execute("""
-                    CREATE MATERIALIZED VIEW IF NOT EXISTS account_summaries AS
-                    SELECT 
-                        a.id,
-                        a.account_number,
-                        a.owner_name,
-                        a.account_type,
-                        a.balance,
-                        COUNT(t.id) as transaction_count,
-                        COALESCE(SUM(CASE WHEN t.from_account_id = a.id THEN -t.amount ELSE t.amount END), 0) as total_transaction_volume
-                    FROM accounts a
-                    LEFT JOIN transactions t ON (a.id = t.from_account_id OR a.id = t.to_account_id)
-                    WHERE a.is_active = TRUE
-                    GROUP BY a.id, a.account_number, a.owner_name, a.account_type, a.balance
-                """)
-                
-                # Trigger to update account updated_at timestamp
-                cur.execute("""
-                    CREATE OR REPLACE FUNCTION update_account_timestamp()
-                    RETURNS TRIGGER AS $$
-                    BEGIN
-                        NEW.updated_at = NOW();
-                        RETURN NEW;
-                    END;
-                    $$ LANGUAGE plpgsql;
-                """)
-                
-                cur.execute("""
-                    DROP TRIGGER IF EXISTS account_update_trigger ON accounts;
-                    CREATE TRIGGER account_update_trigger
-                        BEFORE UPDATE ON accounts
-                        FOR EACH ROW
-                        EXECUTE FUNCTION update_account_timestamp();
-                """)
+                for statement in schema_statements(updated_at_mode, key_scheme or self.key_scheme):
+                    cur.execute(statement)
                 
             conn.commit()
             logging.info("✓ Enhanced schema created successfully")
 
+    def existing_tables(self) -> List[str]:
+        """Tables of the enhanced schema that already exist in the current database."""
+        with self.get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT table_name FROM information_schema.tables
+                    WHERE table_schema = current_schema()
+                    AND table_name IN ('accounts', 'transactions', 'transactions_archive')
+                    ORDER BY table_name
+                """)
+                return [row['table_name'] for row in cur.fetchall()]
+
     def cleanup_schema(self):
         """Drop all tables, views, functions, and triggers created by the demo."""
         print("🧹 Cleaning up enhanced schema...")
@@ -144,6 +983,10 @@ class CockroachDBManager:
                     cur.execute("DROP FUNCTION IF EXISTS update_account_timestamp")
                     logging.info("✓ Dropped function: update_account_timestamp")
                     
+                    # Drop transactions archive
+                    cur.execute("DROP TABLE IF EXISTS transactions_archive")
+                    logging.info("✓ Dropped table: transactions_archive")
+                    
                     # Drop transactions table (has foreign key references to accounts)
                     cur.execute("DROP TABLE IF EXISTS transactions CASCADE")
                     logging.info("✓ Dropped table: transactions")
@@ -159,8 +1002,12 @@ class CockroachDBManager:
             logging.error(f"❌ Error during schema cleanup: {e}")
             raise
 
-    def create_sample_accounts(self, count: int = 5) -> List[uuid.UUID]:
-        """Create sample accounts with realistic data."""
+    def create_sample_accounts(self, count: int = 5) -> List:
+        """Create sample accounts with realistic data.
+
+        Ids are generated by the database according to the key scheme, so the
+        returned list holds UUIDs or integers.
+        """
         account_types = ['checking', 'savings', 'business']
         names = ['Alice Johnson', 'Bob Smith', 'Carol Davis', 'David Wilson', 'Eva Brown']
         
@@ -169,19 +1016,21 @@ class CockroachDBManager:
         with self.get_connection() as conn:
             with conn.cursor() as cur:
                 for i in range(count):
-                    account_id = uuid.uuid4()
                     account_number = f"ACC{random.randint(1000000, 9999999)}"
                     owner_name = names[i % len(names)]
                     account_type = random.choice(account_types)
                     initial_balance = Decimal(str(random.uniform(500.0, 5000.0))).quantize(Decimal('0.01'))
                     
                     cur.execute("""
-                        INSERT INTO accounts (id, account_number, owner_name, account_type, balance)
-                        VALUES (%s, %s, %s, %s, %s)
+                        INSERT INTO accounts (account_number, owner_name, account_type, balance)
+                        VALUES (%s, %s, %s, %s)
                         ON CONFLICT (account_number) DO NOTHING
-                    """, (account_id, account_number, owner_name, account_type, initial_balance))
+                        RETURNING id
+                    """, (account_number, owner_name, account_type, initial_balance))
                     
-                    account_ids.append(account_id)
+                    row = cur.fetchone()
+                    if row:
+                        account_ids.append(row['id'])
                 
             conn.commit()
             logging.info(f"✓ Created {count} sample accounts")
@@ -231,17 +1080,125 @@ class CockroachDBManager:
         
         with self.get_connection() as conn:
             self.run_transaction(conn, transfer_operation)
+            self._refresh_cached_accounts(conn, [from_account_id, to_account_id])
+
+    def batch_transfer(self, transfers: List[tuple], batch_size: int = 500) -> List[Dict]:
+        """Apply many transfers with a handful of statements per transaction.
+
+        Each item of *transfers* is ``(from_account_id, to_account_id, amount)``
+        with an optional fourth ``description``. Transfers are applied in order
+        in chunks of *batch_size*: every account in a chunk is locked in ID order
+        with one query, funds are checked in memory against the running
+        balances, and the surviving transfers are written with one UPDATE and
+        one multi-row INSERT. Returns one ``{'index', 'status', 'error'}`` dict
+        per transfer; a failed transfer does not abort the rest of its chunk.
+        If a chunk's transaction fails (a database error or exhausted
+        retries) all of its transfers are reported ``failed``, or ``unknown``
+        when the commit outcome is ambiguous, and later chunks still run.
+        """
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+
+        results = []
+        for start in range(0, len(transfers), batch_size):
+            chunk = transfers[start:start + batch_size]
+            chunk_results = []
+            updated = []
+
+            def batch_operation(conn):
+                # Rebuilt on every attempt so a retried chunk reports afresh
+                chunk_results.clear()
+                updated.clear()
+                with conn.cursor() as cur:
+                    account_ids = sorted({t[0] for t in chunk} | {t[1] for t in chunk})
+                    cur.execute("""
+                        SELECT id, balance, is_active FROM accounts
+                        WHERE id = ANY(%s) ORDER BY id FOR UPDATE
+                    """, (account_ids,))
+                    accounts = {row['id']: row for row in cur.fetchall()}
+                    balances = {account_id: row['balance'] for account_id, row in accounts.items()}
+
+                    deltas = {}
+                    applied = []
+                    for offset, transfer in enumerate(chunk):
+                        from_account_id, to_account_id, amount = transfer[:3]
+                        error = None
+                        if from_account_id not in accounts or to_account_id not in accounts:
+                            error = "One or both accounts not found"
+                        elif not accounts[from_account_id]['is_active'] or not accounts[to_account_id]['is_active']:
+                            error = "One or both accounts are inactive"
+                        elif from_account_id == to_account_id:
+                            error = "Cannot transfer to the same account"
+                        elif amount <= 0:
+                            error = f"Invalid amount: {amount}"
+                        elif balances[from_account_id] < amount:
+                            error = f"Insufficient funds: have {balances[from_account_id]}, need {amount}"
+
+                        chunk_results.append({
+                            'index': start + offset,
+                            'status': 'failed' if error else 'completed',
+                            'error': error
+                        })
+                        if error:
+                            continue
+
+                        balances[from_account_id] -= amount
+                        balances[to_account_id] += amount
+                        deltas[from_account_id] = deltas.get(from_account_id, 0) - amount
+                        deltas[to_account_id] = deltas.get(to_account_id, 0) + amount
+                        description = transfer[3] if len(transfer) > 3 else None
+                        applied.append((from_account_id, to_account_id, amount,
+                                        description or f"Transfer of ${amount}"))
+
+                    if not applied:
+                        return
+
+                    # Apply every net balance change in one set-based statement
+                    psycopg2.extras.execute_values(cur, """
+                        UPDATE accounts SET balance = accounts.balance + v.delta
+                        FROM (VALUES %s) AS v(id, delta)
+                        WHERE accounts.id = v.id
+                    """, sorted(deltas.items()), template=f"(%s::{self.key_type}, %s::DECIMAL)",
+                        page_size=len(deltas))
+
+                    psycopg2.extras.execute_values(cur, """
+                        INSERT INTO transactions (from_account_id, to_account_id, amount, transaction_type, description)
+                        VALUES %s
+                    """, applied, template="(%s, %s, %s, 'transfer', %s)", page_size=len(applied))
+                    updated.extend(deltas)
+
+            try:
+                with self.get_connection() as conn:
+                    self.run_transaction(conn, batch_operation)
+                    self._refresh_cached_accounts(conn, updated)
+            except Exception as e:
+                logging.error(f"Batch transfer chunk {start}-{start + len(chunk) - 1} failed: {e}")
+                status = 'unknown' if isinstance(e, AmbiguousCommitError) else 'failed'
+                results.extend({'index': start + offset, 'status': status, 'error': str(e)}
+                               for offset in range(len(chunk)))
+                continue
+            results.extend(chunk_results)
+
+        completed = sum(1 for result in results if result['status'] == 'completed')
+        logging.info(f"✓ Batch transfer completed: {completed}/{len(transfers)} transfers applied")
+        return results
 
     def bulk_deposit(self, account_amounts: Dict[uuid.UUID, Decimal]):
         """Perform bulk deposits using batch operations."""
+        updated = []
+
         def bulk_operation(conn):
+            updated.clear()
             with conn.cursor() as cur:
                 # Batch update balances
                 for account_id, amount in account_amounts.items():
                     cur.execute("""
                         UPDATE accounts SET balance = balance + %s 
                         WHERE id = %s AND is_active = TRUE
+                        RETURNING id
                     """, (amount, account_id))
+                    if cur.fetchone() is not None:
+                        updated.append(account_id)
                     
                     # Log deposit transaction
                     cur.execute("""
@@ -251,126 +1208,480 @@ class CockroachDBManager:
         
         with self.get_connection() as conn:
             self.run_transaction(conn, bulk_operation)
+            self._refresh_cached_accounts(conn, updated)
         
         logging.info(f"✓ Bulk deposit completed for {len(account_amounts)} accounts")
 
-    def get_account_analytics(self) -> Dict:
-        """Get comprehensive account analytics using window functions and aggregations."""
+    def archive_transactions(self, older_than: timedelta = timedelta(days=90), batch_size: int = 1000,
+                             pause: float = 0.0) -> int:
+        """Move transactions older than *older_than* into transactions_archive.
+
+        Rows move oldest first in chunks of *batch_size*, each chunk in its own
+        short transaction (one DELETE ... RETURNING feeding an INSERT), so the
+        archiver never holds locks or intents for long. *pause* seconds are
+        slept between chunks to leave room for foreground traffic. Returns
+        the number of rows archived.
+        """
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+
+        # A fixed cutoff keeps the set of rows to move from growing while we work
+        with self.get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT NOW() - %s AS cutoff", (older_than,))
+                cutoff = cur.fetchone()['cutoff']
+            conn.rollback()
+
+        archived = 0
+        while True:
+            moved = []
+
+            def archive_batch_operation(conn):
+                with conn.cursor() as cur:
+                    cur.execute("""
+                        WITH moved AS (
+                            DELETE FROM transactions
+                            WHERE created_at < %s
+                            ORDER BY created_at, id
+                            LIMIT %s
+                            RETURNING id, from_account_id, to_account_id, amount,
+                                      transaction_type, description, created_at, status
+                        )
+                        INSERT INTO transactions_archive (id, from_account_id, to_account_id, amount,
+                                                          transaction_type, description, created_at, status)
+                        SELECT * FROM moved
+                    """, (cutoff, batch_size))
+                    moved[:] = [cur.rowcount]
+
+            with self.get_connection() as conn:
+                self.run_transaction(conn, archive_batch_operation)
+            archived += moved[0]
+            if moved[0] < batch_size:
+                break
+            if pause:
+                time.sleep(pause)
+
+        logging.info(f"✓ Archived {archived} transactions older than {cutoff}")
+        return archived
+
+    def enable_transaction_ttl(self, retention: timedelta = timedelta(days=90),
+                               cron: str = '@hourly', delete_batch_size: int = 100):
+        """Let row-level TTL delete transactions older than *retention* instead of archiving them."""
+        # TIMESTAMPTZ + INTERVAL is not immutable, so add the interval in UTC
+        expiration = (f"((created_at AT TIME ZONE 'UTC') + "
+                      f"INTERVAL '{int(retention.total_seconds())} seconds') AT TIME ZONE 'UTC'")
         with self.get_connection() as conn:
             with conn.cursor() as cur:
-                # Overall statistics
-                cur.execute("""
-                    SELECT 
-                        COUNT(*) as total_accounts,
-                        SUM(balance) as total_balance,
-                        AVG(balance) as avg_balance,
-                        MIN(balance) as min_balance,
-                        MAX(balance) as max_balance,
-                        PERCENTILE_DISC(0.5) WITHIN GROUP (ORDER BY balance) as median_balance
-                    FROM accounts 
-                    WHERE is_active = TRUE
-                """)
-                overall_stats = cur.fetchone()
-                
-                # Account distribution by type
-                cur.execute("""
-                    SELECT 
-                        account_type,
-                        COUNT(*) as count,
-                        SUM(balance) as total_balance,
-                        AVG(balance) as avg_balance
-                    FROM accounts 
-                    WHERE is_active = TRUE
-                    GROUP BY account_type
-                    ORDER BY count DESC
-                """)
-                type_distribution = cur.fetchall()
-                
-                # Recent transaction activity
-                cur.execute("""
-                    SELECT 
-                        DATE_TRUNC('day', created_at) as date,
-                        transaction_type,
-                        COUNT(*) as count,
-                        SUM(amount) as total_amount
-                    FROM transactions 
-                    WHERE created_at >= NOW() - INTERVAL '30 days'
-                    GROUP BY DATE_TRUNC('day', created_at), transaction_type
-                    ORDER BY date DESC, transaction_type
-                """)
-                recent_activity = cur.fetchall()
-                
-                # Top accounts by balance
                 cur.execute("""
-                    SELECT 
-                        account_number,
-                        owner_name,
-                        account_type,
-                        balance,
-                        ROW_NUMBER() OVER (ORDER BY balance DESC) as rank
-                    FROM accounts 
-                    WHERE is_active = TRUE
-                    ORDER BY balance DESC
-                    LIMIT 10
-                """)
-                top_accounts = cur.fetchall()
-        
+                    ALTER TABLE transactions SET (
+                        ttl_expiration_expression = %s,
+                        ttl_job_cron = %s,
+                        ttl_delete_batch_size = %s
+                    )
+                """, (expiration, cron, delete_batch_size))
+            conn.commit()
+        logging.info(f"✓ Row-level TTL enabled on transactions ({retention} retention, {cron})")
+
+    def disable_transaction_ttl(self):
+        """Turn row-level TTL on transactions off again."""
+        with self.get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("ALTER TABLE transactions RESET (ttl)")
+            conn.commit()
+        logging.info("✓ Row-level TTL disabled on transactions")
+
+    def get_account_analytics(self, concurrent: bool = False) -> Dict:
+        """Get comprehensive account analytics using window functions and aggregations.
+
+        With ``concurrent=True`` the independent queries run in parallel, each on
+        its own pooled connection. Per-query timings are kept in
+        ``self.last_query_timings``.
+        """
+        if concurrent:
+            results = self._run_analytics_concurrently()
+        else:
+            results = {}
+            timings = {}
+            with self.get_connection() as conn:
+                for name in ANALYTICS_QUERIES:
+                    results[name], timings[name] = self._run_analytics_query(conn, name)
+            self.last_query_timings = timings
+
         return {
-            'overall_stats': dict(overall_stats),
-            'type_distribution': [dict(row) for row in type_distribution],
-            'recent_activity': [dict(row) for row in recent_activity],
-            'top_accounts': [dict(row) for row in top_accounts]
+            'overall_stats': dict(results['overall_stats']),
+            'type_distribution': [dict(row) for row in results['type_distribution']],
+            'recent_activity': [dict(row) for row in results['recent_activity']],
+            'top_accounts': [dict(row) for row in results['top_accounts']]
         }
 
+    def _run_analytics_query(self, conn, name: str):
+        """Run one registered analytics query, returning its rows and elapsed seconds."""
+        sql, fetch_one = ANALYTICS_QUERIES[name]
+        start = time.perf_counter()
+        with conn.cursor() as cur:
+            cur.execute(sql)
+            rows = cur.fetchone() if fetch_one else cur.fetchall()
+        return rows, time.perf_counter() - start
+
+    def _run_analytics_group(self, conn, names: List[str], as_of: Decimal) -> Dict:
+        """Run several analytics queries in order on one connection, reading at *as_of*."""
+        with conn.cursor() as cur:
+            cur.execute("SET TRANSACTION AS OF SYSTEM TIME %s", (str(as_of),))
+        try:
+            return {name: self._run_analytics_query(conn, name) for name in names}
+        finally:
+            conn.rollback()
+
+    def _run_analytics_concurrently(self) -> Dict:
+        """Fan the analytics queries out over the connection pool.
+
+        Every query that can get a connection of its own runs on a worker thread.
+        When the pool is exhausted the remaining queries run one after another
+        on a single connection instead of failing. All of them read AS OF
+        SYSTEM TIME one shared timestamp, so they see the same snapshot just
+        like the single transaction of the sequential path.
+        """
+        results = {}
+        timings = {}
+        connections = []
+        try:
+            for _ in ANALYTICS_QUERIES:
+                try:
+                    connections.append(self.connection_pool.getconn(timeout=0))
+                except pool.PoolError:
+                    break
+
+            if not connections:
+                # No connection to spare: wait for one like the sequential path
+                with self.get_connection() as conn:
+                    for name in ANALYTICS_QUERIES:
+                        results[name], timings[name] = self._run_analytics_query(conn, name)
+            else:
+                # Spread the queries round-robin; each connection runs its share in order
+                names = list(ANALYTICS_QUERIES)
+                groups = [names[i::len(connections)] for i in range(len(connections))]
+                with connections[0].cursor() as cur:
+                    cur.execute("SELECT cluster_logical_timestamp() AS snapshot")
+                    snapshot = cur.fetchone()['snapshot']
+                connections[0].rollback()
+                if len(connections) < len(names):
+                    logging.debug(f"Connection pool exhausted, running {len(names)} analytics "
+                                  f"queries on {len(connections)} connections")
+                with ThreadPoolExecutor(max_workers=len(connections)) as executor:
+                    futures = [
+                        executor.submit(self._run_analytics_group, conn, group, snapshot)
+                        for conn, group in zip(connections, groups)
+                    ]
+                    for future in futures:
+                        for name, (rows, elapsed) in future.result().items():
+                            results[name] = rows
+                            timings[name] = elapsed
+        finally:
+            for conn in connections:
+                self.connection_pool.putconn(conn)
+
+        self.last_query_timings = timings
+        for name, elapsed in timings.items():
+            logging.debug(f"Analytics query {name}: {elapsed * 1000:.1f}ms")
+        return results
+
+    def get_account(self, account_id, max_staleness: Optional[float] = None) -> Optional[Dict]:
+        """Read one account row, from the account cache when it is fresh enough.
+
+        The cache answers only while its changefeed is at most *max_staleness*
+        seconds (default ``cache_max_staleness``) behind; otherwise, and for
+        accounts not cached yet, the row is read from the database and cached.
+        Returns None for unknown accounts.
+        """
+        cache = self.account_cache
+        if cache is not None:
+            hit, row = cache.get(account_id, self.cache_max_staleness if max_staleness is None else max_staleness)
+            if hit:
+                return row
+            generation = cache.generation
+
+        with self.get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(f"SELECT {CACHED_ACCOUNT_COLUMNS} FROM accounts WHERE id = %s", (account_id,))
+                row = cur.fetchone()
+
+        if row is None:
+            return None
+        row = dict(row)
+        timestamp, read_timestamp = row.pop('mvcc_timestamp'), row.pop('read_timestamp')
+        if cache is not None:
+            cache.admit(account_id, timestamp, row, generation, read_timestamp)
+        return row
+
+    def _refresh_cached_accounts(self, conn, account_ids):
+        """Read rows this process just committed back into the account cache.
+
+        Runs after the commit, so the write transaction itself never fixes its
+        timestamp. Rows that cannot be read back are dropped from the cache.
+        """
+        cache = self.account_cache
+        if cache is None or not account_ids:
+            return
+        generation = cache.generation
+        try:
+            with conn.cursor() as cur:
+                cur.execute(f"SELECT {CACHED_ACCOUNT_COLUMNS} FROM accounts WHERE id = ANY(%s)",
+                            (sorted(account_ids),))
+                rows = cur.fetchall()
+            conn.rollback()
+        except psycopg2.Error as e:
+            logging.warning(f"Could not read written accounts back into the cache: {e}")
+            cache.discard(account_ids)
+            return
+        for row in rows:
+            row = dict(row)
+            timestamp, read_timestamp = row.pop('mvcc_timestamp'), row.pop('read_timestamp')
+            cache.admit(row['id'], timestamp, row, generation, read_timestamp)
+
     def get_transaction_history(self, account_id: uuid.UUID, limit: int = 50) -> List[Dict]:
         """Get detailed transaction history for an account."""
         with self.get_connection() as conn:
             with conn.cursor() as cur:
-                cur.execute("""
-                    SELECT 
-                        t.id,
-                        t.transaction_type,
-                        t.amount,
-                        t.description,
-                        t.created_at,
-                        t.status,
-                        CASE 
-                            WHEN t.from_account_id = %s THEN 'outgoing'
-                            WHEN t.to_account_id = %s THEN 'incoming'
-                            ELSE 'other'
-                        END as direction,
-                        from_acc.account_number as from_account,
-                        from_acc.owner_name as from_owner,
-                        to_acc.account_number as to_account,
-                        to_acc.owner_name as to_owner
-                    FROM transactions t
-                    LEFT JOIN accounts from_acc ON t.from_account_id = from_acc.id
-                    LEFT JOIN accounts to_acc ON t.to_account_id = to_acc.id
-                    WHERE t.from_account_id = %s OR t.to_account_id = %s
-                    ORDER BY t.created_at DESC
-                    LIMIT %s
-                """, (account_id, account_id, account_id, account_id, limit))
+                cur.execute(TRANSACTION_HISTORY_QUERY, (account_id, account_id, account_id, account_id, limit))
                 
                 return [dict(row) for row in cur.fetchall()]
 
-    def run_transaction(self, conn, operation, max_retries: int = 3):
-        """Enhanced transaction runner with exponential backoff."""
+    def run_diagnostics(self, apply_suggestions: bool = False, runs: int = 5) -> Dict:
+        """Capture EXPLAIN ANALYZE (DISTSQL) plans and timings for the hot queries.
+
+        Every query in ``DIAGNOSTIC_QUERIES`` runs *runs* times for a median
+        latency, then once under EXPLAIN ANALYZE for its plan and execution
+        statistics. Queries whose plans contain full scans or index joins get
+        their suggested indexes attached; with *apply_suggestions* those
+        indexes are created and every query is measured again under ``after``.
+        """
+        account_id = self._representative_account()
+        report = {}
+        for name, spec in DIAGNOSTIC_QUERIES.items():
+            before = self._diagnose_query(name, account_id, runs)
+            needs_index = before['full_scans'] or before['index_joins']
+            report[name] = {
+                'before': before,
+                'suggested_indexes': spec['indexes'] if needs_index else [],
+                'note': spec.get('note')
+            }
+
+        if apply_suggestions:
+            statements = list(dict.fromkeys(
+                statement for entry in report.values() for statement in entry['suggested_indexes']))
+            if statements:
+                with self.get_connection() as conn:
+                    # Schema changes run outside an explicit transaction
+                    conn.autocommit = True
+                    try:
+                        with conn.cursor() as cur:
+                            for statement in statements:
+                                logging.info(f"Applying: {statement}")
+                                cur.execute(statement)
+                    finally:
+                        conn.autocommit = False
+            for name, entry in report.items():
+                entry['applied_indexes'] = statements
+                entry['after'] = self._diagnose_query(name, account_id, runs)
+
+        return report
+
+    def _representative_account(self):
+        """The account with the most outgoing transactions, or any account."""
+        with self.get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT from_account_id AS id FROM transactions
+                    WHERE from_account_id IS NOT NULL
+                    GROUP BY from_account_id ORDER BY COUNT(*) DESC LIMIT 1
+                """)
+                row = cur.fetchone()
+                if row is None:
+                    cur.execute("SELECT id FROM accounts LIMIT 1")
+                    row = cur.fetchone()
+            conn.rollback()
+        return row['id'] if row else None
+
+    def _diagnose_query(self, name: str, account_id, runs: int) -> Dict:
+        """Time one registered query and capture its EXPLAIN ANALYZE output."""
+        spec = DIAGNOSTIC_QUERIES[name]
+        params = spec['params'](account_id)
+        timings = []
+        with self.get_connection() as conn:
+            with conn.cursor() as cur:
+                for _ in range(runs):
+                    start = time.perf_counter()
+                    cur.execute(spec['sql'], params)
+                    cur.fetchall()
+                    timings.append(time.perf_counter() - start)
+                cur.execute("EXPLAIN ANALYZE (DISTSQL) " + spec['sql'], params)
+                plan = [next(iter(row.values())) for row in cur.fetchall()]
+            conn.rollback()
+
+        statistics = {}
+        for line in plan:
+            for key, pattern in EXPLAIN_STATISTICS.items():
+                match = pattern.search(line)
+                if match and key not in statistics:
+                    statistics[key] = match.group(1).strip()
+
+        # Attribute each FULL SCAN to the table named by its scan node
+        full_scans = []
+        table = None
+        for line in plan:
+            table_match = re.search(r'table: (\S+)', line)
+            if table_match:
+                table = table_match.group(1)
+            if 'FULL SCAN' in line:
+                full_scans.append(table or 'unknown')
+
+        return {
+            'median_ms': sorted(timings)[len(timings) // 2] * 1000 if timings else None,
+            'statistics': statistics,
+            'full_scans': full_scans,
+            'index_joins': sum(1 for line in plan if 'index join' in line),
+            'plan': plan
+        }
+
+    def run_transaction(self, conn, operation, max_retries: Optional[int] = None,
+                        name: Optional[str] = None, retry_mode: Optional[str] = None,
+                        idempotent: bool = False):
+        """Enhanced transaction runner with exponential backoff.
+
+        Both retry modes wait between attempts as ``_retry_backoff`` says.
+        Attempts, retries, backoff and latency are reported to
+        ``self.instrumentation`` under *name*, which defaults to the
+        operation's function name. *max_retries* and *retry_mode* default to
+        the manager's settings; see ``_run_savepoint_transaction`` for the
+        ``'savepoint'`` mode and the meaning of *idempotent*.
+        """
+        max_retries = max_retries or self.max_retries
+        retry_mode = retry_mode or self.retry_mode
+        if retry_mode == 'savepoint':
+            return self._run_savepoint_transaction(conn, operation, max_retries, name, idempotent)
+
+        name = name or getattr(operation, '__name__', 'transaction')
+        instrumentation = self.instrumentation
+        start = time.perf_counter()
         for retry in range(1, max_retries + 1):
+            instrumentation.on_attempt(name, retry)
+            attempt_start = time.perf_counter()
+            if instrumentation.captures_statements:
+                _statement_capture.statements = []
             try:
                 with conn:
                     operation(conn)
+                now = time.perf_counter()
+                instrumentation.on_commit(name, retry, now - start, now - attempt_start,
+                                          getattr(_statement_capture, 'statements', None))
                 return
             except SerializationFailure as e:
                 if retry == max_retries:
+                    instrumentation.on_failure(name, retry, time.perf_counter() - start, e.pgcode)
                     raise
-                sleep_time = (2 ** retry) * 0.1 * (random.random() + 0.5)
+                sleep_time = self._retry_backoff(retry)
                 logging.debug(f"Serialization failure, retrying in {sleep_time:.2f}s")
+                instrumentation.on_retry(name, retry, e.pgcode, sleep_time)
+                time.sleep(sleep_time)
+            except psycopg2.Error as e:
+                instrumentation.on_failure(name, retry, time.perf_counter() - start, e.pgcode)
+                logging.error(f"Database error: {e}")
+                raise
+            except Exception:
+                instrumentation.on_failure(name, retry, time.perf_counter() - start, None)
+                raise
+            finally:
+                _statement_capture.statements = None
+
+    def _run_savepoint_transaction(self, conn, operation, max_retries: int,
+                                   name: Optional[str], idempotent: bool):
+        """Run *operation* using CockroachDB's client-side retry protocol.
+
+        The transaction opens ``SAVEPOINT cockroach_restart``; on a 40001 error
+        it rolls back to the savepoint and tries again inside the same
+        transaction, which keeps its priority and timestamp, then finishes
+        with ``RELEASE SAVEPOINT``. If the commit outcome is unknown (40003, or the connection
+        drops while committing) an ``AmbiguousCommitError`` is raised, unless
+        the operation is *idempotent* and the connection is still usable, in
+        which case it is run again in a fresh transaction.
+        """
+        name = name or getattr(operation, '__name__', 'transaction')
+        instrumentation = self.instrumentation
+        start = time.perf_counter()
+        open_savepoint = True
+        for retry in range(1, max_retries + 1):
+            instrumentation.on_attempt(name, retry)
+            attempt_start = time.perf_counter()
+            if instrumentation.captures_statements:
+                _statement_capture.statements = []
+            try:
+                with conn.cursor() as cur:
+                    if open_savepoint:
+                        cur.execute("SAVEPOINT cockroach_restart")
+                        open_savepoint = False
+                    operation(conn)
+                    try:
+                        cur.execute("RELEASE SAVEPOINT cockroach_restart")
+                        conn.commit()
+                    except psycopg2.Error as e:
+                        if not _is_ambiguous_commit_error(e):
+                            raise
+                        if not idempotent or conn.closed or retry == max_retries:
+                            instrumentation.on_failure(name, retry, time.perf_counter() - start, e.pgcode)
+                            if not conn.closed:
+                                conn.rollback()
+                            raise AmbiguousCommitError(
+                                f"outcome of {name} unknown after commit error: {e}") from e
+                        logging.warning(f"Ambiguous commit of {name}, re-running idempotent transaction")
+                        conn.rollback()
+                        open_savepoint = True
+                        instrumentation.on_retry(name, retry, e.pgcode or 'ambiguous', 0.0)
+                        continue
+                now = time.perf_counter()
+                instrumentation.on_commit(name, retry, now - start, now - attempt_start,
+                                          getattr(_statement_capture, 'statements', None))
+                return
+            except SerializationFailure as e:
+                if retry == max_retries:
+                    instrumentation.on_failure(name, retry, time.perf_counter() - start, e.pgcode)
+                    conn.rollback()
+                    raise
+                with conn.cursor() as cur:
+                    cur.execute("ROLLBACK TO SAVEPOINT cockroach_restart")
+                sleep_time = self._retry_backoff(retry)
+                logging.debug(f"Serialization failure, restarting at savepoint in {sleep_time:.3f}s")
+                instrumentation.on_retry(name, retry, e.pgcode, sleep_time)
                 time.sleep(sleep_time)
+            except AmbiguousCommitError:
+                raise
             except psycopg2.Error as e:
+                instrumentation.on_failure(name, retry, time.perf_counter() - start, e.pgcode)
                 logging.error(f"Database error: {e}")
+                if not conn.closed:
+                    conn.rollback()
+                raise
+            except Exception:
+                instrumentation.on_failure(name, retry, time.perf_counter() - start, None)
+                conn.rollback()
                 raise
+            finally:
+                _statement_capture.statements = None
+
+    def _retry_backoff(self, retry: int) -> float:
+        """Full-jitter exponential backoff, capped at ``retry_backoff_cap`` seconds."""
+        return random.uniform(0, min(self.retry_backoff_cap, self.retry_backoff_base * 2 ** retry))
 
-def  demonstrate_advanced_features():
+    def get_transaction_stats(self) -> Dict:
+        """Per-operation transaction statistics, when the instrumentation keeps them."""
+        snapshot = getattr(self.instrumentation, 'snapshot', None)
+        return snapshot() if snapshot else {}
+
+def  demonstrate_advanced_features(concurrent_analytics: bool = False,
+                                   slow_transaction_ms: Optional[float] = None,
+                                   retry_mode: str = 'rollback',
+                                   updated_at_mode: str = 'trigger',
+                                   key_scheme: str = 'uuid',
+                                   account_cache_size: Optional[int] = None):
     """Demonstrate the enhanced database functionality."""
     dsn = os.environ.get("DATABASE_URL", "postgresql://root@localhost:26257/defaultdb?sslmode=disable")
     
@@ -378,14 +1689,18 @@ def  demonstrate_advanced_features():
     print("=" * 50)
     
     # Initialize the enhanced manager
-    db_manager = CockroachDBManager(dsn)
+    slow_threshold = slow_transaction_ms / 1000 if slow_transaction_ms is not None else None
+    db_manager = CockroachDBManager(dsn, instrumentation=TransactionStats(slow_threshold=slow_threshold),
+                                    retry_mode=retry_mode, key_scheme=key_scheme)
     
     try:
         # Create enhanced schema
-        db_manager.create_schema()
+        db_manager.create_schema(updated_at_mode=updated_at_mode)
         
         # Create sample accounts
         account_ids = db_manager.create_sample_accounts(5)
+        if account_cache_size:
+            db_manager.enable_account_cache(account_cache_size)
         
         # Demonstrate bulk operations
         bulk_deposits = {acc_id: Decimal(str(random.uniform(100, 500))) for acc_id in account_ids[:3]}
@@ -397,15 +1712,22 @@ def  demonstrate_advanced_features():
                 account_ids[0], account_ids[1], 
                 Decimal('250.00'), "Demo transfer"
             )
+
+            # Demonstrate a batch of transfers applied in one transaction
+            batch = [(account_ids[i], account_ids[(i + 1) % len(account_ids)], Decimal('10.00'))
+                     for i in range(len(account_ids))]
+            db_manager.batch_transfer(batch)
         
         # Show analytics
         print("\n📊 Account Analytics:")
-        analytics = db_manager.get_account_analytics()
+        analytics = db_manager.get_account_analytics(concurrent=concurrent_analytics)
         
         stats = analytics['overall_stats']
         print(f"Total Accounts: {stats['total_accounts']}")
         print(f"Total Balance: ${stats['total_balance']:,.2f}")
         print(f"Average Balance: ${stats['avg_balance']:,.2f}")
+        for name, elapsed in db_manager.last_query_timings.items():
+            logging.debug(f"  {name}: {elapsed * 1000:.1f}ms")
         
         # Show transaction history
         if account_ids:
@@ -414,6 +1736,38 @@ def  demonstrate_advanced_features():
             for txn in history[:3]:
                 print(f"  {txn['direction'].title()}: ${txn['amount']} - {txn['description']}")
         
+        # Read balances repeatedly through the changefeed-fed cache
+        if account_cache_size and account_ids:
+            print("\n⚡ Cached Account Reads:")
+            for _ in range(3):
+                for account_id in account_ids:
+                    db_manager.get_account(account_id)
+                time.sleep(1)
+            for account_id in account_ids[:3]:
+                account = db_manager.get_account(account_id)
+                print(f"  {account['owner_name']}: ${account['balance']:,.2f}")
+            cache_metrics = db_manager.get_cache_metrics()
+            lag = cache_metrics['changefeed_lag']
+            reads = cache_metrics['hits'] + cache_metrics['misses'] + cache_metrics['lagging']
+            print(f"Hit rate: {cache_metrics['hit_rate']:.0%} of {reads} reads, "
+                  f"changefeed lag: {'n/a' if lag is None else f'{lag:.2f}s'}")
+        
+        for name, txn_stats in db_manager.get_transaction_stats().items():
+            logging.debug(f"Transactions {name}: {txn_stats['committed']} committed, "
+                          f"{txn_stats['retries']} retries {txn_stats['retry_reasons']}, "
+                          f"{txn_stats['backoff_time']:.2f}s backoff")
+        for entry in db_manager.instrumentation.slow_log:
+            print(f"\n🐢 Slow transaction {entry['name']}: {entry['latency'] * 1000:.1f}ms "
+                  f"in {entry['attempts']} attempt(s)")
+            for statement in entry['statements']:
+                print(f"    {' '.join(statement.split())}")
+
+        pool_metrics = db_manager.get_pool_metrics()
+        logging.debug(f"Pool: {pool_metrics['live_connections']} live, "
+                      f"{pool_metrics['idle_connections']} idle, "
+                      f"avg wait {pool_metrics['wait_time_avg'] * 1000:.1f}ms, "
+                      f"avg checkout {pool_metrics['checkout_time_avg'] * 1000:.1f}ms")
+        
         print("\n✅ All enhanced features demonstrated successfully!")
         
     except Exception as e:
@@ -423,6 +1777,282 @@ def  demonstrate_advanced_features():
         db_manager.close_all_connections()
 
 
+def run_transfer_load(db_manager: CockroachDBManager, account_ids: List, threads: int,
+                       transfers_per_thread: int) -> Dict:
+    """Run random $1 transfers among *account_ids* from *threads* callers and summarize them."""
+    latencies = []
+    failures = defaultdict(int)
+    lock = threading.Lock()
+
+    def transfer_worker():
+        rng = random.Random()
+        for _ in range(transfers_per_thread):
+            from_account_id, to_account_id = rng.sample(account_ids, 2)
+            start = time.perf_counter()
+            try:
+                db_manager.enhanced_transfer_funds(from_account_id, to_account_id, Decimal('1.00'))
+                with lock:
+                    latencies.append(time.perf_counter() - start)
+            except Exception as e:
+                with lock:
+                    failures[type(e).__name__] += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        for _ in range(threads):
+            executor.submit(transfer_worker)
+    elapsed = time.perf_counter() - start
+
+    txn_stats = db_manager.get_transaction_stats().get('transfer_operation', {})
+    return {
+        **latency_summary(latencies),
+        'throughput': len(latencies) / elapsed if elapsed > 0 else 0.0,
+        'retries': txn_stats.get('retries', 0),
+        'failures': dict(failures)
+    }
+
+
+def print_transfer_results(label: str, results: Dict):
+    """Print one row of run_transfer_load results per benchmarked variant."""
+    print(f"{label:<10} {'txn/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8} {'retries':>8} failures")
+    for name, result in results.items():
+        print(f"{name:<10} {result['throughput']:>8.1f} {result['p50']:>8.1f} {result['p95']:>8.1f} "
+              f"{result['p99']:>8.1f} {result['max']:>8.1f} {result['retries']:>8} {result['failures'] or '-'}")
+
+
+def benchmark_retry_modes(threads: int = 16, transfers_per_thread: int = 50, hot_accounts: int = 2,
+                          force: bool = False):
+    """Compare transfer latency under contention for each retry mode.
+
+    Every thread transfers small amounts between the same few hot accounts,
+    so most transactions conflict; the tail latency shows how often a
+    transaction is starved by restarting from scratch. Both modes back off
+    the same way, and each runs on a freshly created schema that is dropped
+    afterwards; existing tables are only dropped with *force* (see
+    ``confirm_scratch_schema``).
+    """
+    dsn = os.environ.get("DATABASE_URL", "postgresql://root@localhost:26257/defaultdb?sslmode=disable")
+    
+    print("🔥 Contention Benchmark: rollback vs. savepoint retries")
+    print(f"Threads: {threads}, Transfers/thread: {transfers_per_thread}, Hot accounts: {hot_accounts}")
+    print("=" * 50)
+    
+    results = {}
+    for retry_mode in RETRY_MODES:
+        db_manager = CockroachDBManager(dsn, max_connections=threads, retry_mode=retry_mode,
+                                        max_retries=20)
+        try:
+            if not results and not confirm_scratch_schema(db_manager, force):
+                return results
+            db_manager.cleanup_schema()
+            db_manager.create_schema()
+            account_ids = db_manager.create_sample_accounts(hot_accounts)
+            results[retry_mode] = run_transfer_load(db_manager, account_ids, threads, transfers_per_thread)
+            db_manager.cleanup_schema()
+        finally:
+            db_manager.close_all_connections()
+    
+    print_transfer_results('mode', results)
+    return results
+
+
+def confirm_scratch_schema(db_manager: CockroachDBManager, force: bool = False) -> bool:
+    """Check that a benchmark may drop and recreate the enhanced schema.
+
+    Refuses, after saying why, when the tables already exist, unless *force*
+    is set; run benchmarks against a scratch database instead.
+    """
+    existing = db_manager.existing_tables()
+    if existing and not force:
+        print(f"❌ {', '.join(existing)} already exist in this database and the benchmark would drop them.")
+        print("   Point the benchmark at a scratch database, or pass --force to drop them anyway.")
+        return False
+    return True
+
+
+def benchmark_updated_at_modes(threads: int = 16, transfers_per_thread: int = 50, accounts: int = 100,
+                               force: bool = False):
+    """Compare transfer throughput with the updated_at trigger and without it.
+
+    Each mode gets a freshly created schema, spread-out transfers among
+    *accounts* accounts so contention stays low, and is dropped again with
+    cleanup_schema afterwards. Existing tables are only dropped with *force*;
+    see ``confirm_scratch_schema``.
+    """
+    dsn = os.environ.get("DATABASE_URL", "postgresql://root@localhost:26257/defaultdb?sslmode=disable")
+    
+    print("⏱️  updated_at Benchmark: plpgsql trigger vs. ON UPDATE NOW()")
+    print(f"Threads: {threads}, Transfers/thread: {transfers_per_thread}, Accounts: {accounts}")
+    print("=" * 50)
+    
+    results = {}
+    for updated_at_mode in UPDATED_AT_MODES:
+        db_manager = CockroachDBManager(dsn, max_connections=threads)
+        try:
+            if not results and not confirm_scratch_schema(db_manager, force):
+                return results
+            db_manager.cleanup_schema()
+            db_manager.create_schema(updated_at_mode=updated_at_mode)
+            account_ids = db_manager.create_sample_accounts(accounts)
+            results[updated_at_mode] = run_transfer_load(db_manager, account_ids, threads, transfers_per_thread)
+            db_manager.cleanup_schema()
+        finally:
+            db_manager.close_all_connections()
+    
+    print_transfer_results('mode', results)
+    return results
+
+
+def benchmark_retention(rounds: int = 5, rows_per_round: int = 20000, keep_days: int = 30,
+                        force: bool = False):
+    """Measure ingest and query latency as transaction history grows, then after archiving.
+
+    Each round back-fills *rows_per_round* deposits spread over the past year
+    and times the recent-activity and transaction-history queries. Finally
+    everything older than *keep_days* is archived and the queries are timed
+    again. Runs on a freshly created schema that is dropped afterwards;
+    existing tables are only dropped with *force* (see ``confirm_scratch_schema``).
+    """
+    dsn = os.environ.get("DATABASE_URL", "postgresql://root@localhost:26257/defaultdb?sslmode=disable")
+    
+    print("🗄️  Retention Benchmark: history growth vs. archiving")
+    print(f"Rounds: {rounds}, Rows/round: {rows_per_round:,}, Keep: {keep_days} days")
+    print("=" * 50)
+    
+    db_manager = CockroachDBManager(dsn)
+    
+    def query_latency(sql, params=None, runs=5):
+        timings = []
+        with db_manager.get_connection() as conn:
+            with conn.cursor() as cur:
+                for _ in range(runs):
+                    start = time.perf_counter()
+                    cur.execute(sql, params)
+                    cur.fetchall()
+                    timings.append(time.perf_counter() - start)
+            conn.rollback()
+        return latency_summary(timings)['p50']
+    
+    try:
+        if not confirm_scratch_schema(db_manager, force):
+            return {}
+        db_manager.cleanup_schema()
+        db_manager.create_schema()
+        account_ids = db_manager.create_sample_accounts(20)
+        rng = random.Random(42)
+        
+        print(f"{'history rows':>12} {'ingest rows/s':>14} {'recent ms':>10} {'history ms':>11}")
+        results = []
+        total_rows = 0
+        for _ in range(rounds):
+            rows = [
+                (rng.choice(account_ids), Decimal(rng.randint(1, 500)), timedelta(seconds=rng.randint(0, 365 * 86400)))
+                for _ in range(rows_per_round)
+            ]
+            start = time.perf_counter()
+            for offset in range(0, len(rows), 1000):
+                def ingest_operation(conn, chunk=rows[offset:offset + 1000]):
+                    with conn.cursor() as cur:
+                        psycopg2.extras.execute_values(cur, """
+                            INSERT INTO transactions (to_account_id, amount, transaction_type, description, created_at)
+                            VALUES %s
+                        """, chunk, template="(%s, %s, 'deposit', 'Backfilled deposit', NOW() - %s)",
+                            page_size=len(chunk))
+                with db_manager.get_connection() as conn:
+                    db_manager.run_transaction(conn, ingest_operation)
+            ingest_rate = len(rows) / (time.perf_counter() - start)
+            total_rows += len(rows)
+            
+            result = {
+                'history_rows': total_rows,
+                'ingest_rows_per_second': ingest_rate,
+                'recent_activity_ms': query_latency(ANALYTICS_QUERIES['recent_activity'][0]),
+                'transaction_history_ms': query_latency(
+                    TRANSACTION_HISTORY_QUERY, (account_ids[0],) * 4 + (50,))
+            }
+            results.append(result)
+            print(f"{result['history_rows']:>12,} {ingest_rate:>14,.0f} {result['recent_activity_ms']:>10.1f} "
+                  f"{result['transaction_history_ms']:>11.1f}")
+        
+        start = time.perf_counter()
+        archived = db_manager.archive_transactions(timedelta(days=keep_days))
+        archive_time = time.perf_counter() - start
+        after = {
+            'history_rows': total_rows - archived,
+            'archived_rows': archived,
+            'archive_rows_per_second': archived / archive_time if archive_time > 0 else 0.0,
+            'recent_activity_ms': query_latency(ANALYTICS_QUERIES['recent_activity'][0]),
+            'transaction_history_ms': query_latency(TRANSACTION_HISTORY_QUERY, (account_ids[0],) * 4 + (50,))
+        }
+        print(f"{after['history_rows']:>12,} {'(archived)':>14} {after['recent_activity_ms']:>10.1f} "
+              f"{after['transaction_history_ms']:>11.1f}")
+        print(f"\nArchived {archived:,} rows at {after['archive_rows_per_second']:,.0f} rows/s")
+        
+        db_manager.cleanup_schema()
+        return {'growth': results, 'after_archive': after}
+    finally:
+        db_manager.close_all_connections()
+
+
+def diagnose_queries(apply_suggestions: bool = False, output_path: str = "query_diagnostics.json"):
+    """Run the query diagnostics and print a summary; full plans go to *output_path*."""
+    dsn = os.environ.get("DATABASE_URL", "postgresql://root@localhost:26257/defaultdb?sslmode=disable")
+    
+    print("🔬 Query Diagnostics (EXPLAIN ANALYZE)")
+    print("=" * 50)
+    
+    db_manager = CockroachDBManager(dsn)
+    try:
+        report = db_manager.run_diagnostics(apply_suggestions=apply_suggestions)
+    finally:
+        db_manager.close_all_connections()
+    
+    print(f"{'query':<20} {'median ms':>10} {'KV rows':>9} {'KV bytes':>10} {'contention':>11}  full scans")
+    for name, entry in report.items():
+        before = entry['before']
+        stats = before['statistics']
+        print(f"{name:<20} {before['median_ms']:>10.2f} {stats.get('rows_read_from_kv', '-'):>9} "
+              f"{stats.get('kv_bytes_read', '-'):>10} {stats.get('contention_time', '-'):>11}  "
+              f"{', '.join(before['full_scans']) or '-'}")
+    
+    for name, entry in report.items():
+        if entry['suggested_indexes']:
+            print(f"\n💡 {name}:")
+            for statement in entry['suggested_indexes']:
+                print(f"   {statement};")
+            if entry['note']:
+                print(f"   Note: {entry['note']}")
+    
+    if apply_suggestions:
+        print(f"\n{'query':<20} {'before ms':>10} {'after ms':>10}  full scans after")
+        for name, entry in report.items():
+            after = entry['after']
+            print(f"{name:<20} {entry['before']['median_ms']:>10.2f} {after['median_ms']:>10.2f}  "
+                  f"{', '.join(after['full_scans']) or '-'}")
+    
+    with open(output_path, "w") as f:
+        json.dump(report, f, indent=2, default=str)
+    print(f"\n📄 Plans and statistics written to {output_path}")
+    return report
+
+
+def manage_retention(archive_older_than: Optional[int] = None, ttl_days: Optional[int] = None):
+    """Archive old transactions and/or configure row-level TTL on them."""
+    dsn = os.environ.get("DATABASE_URL", "postgresql://root@localhost:26257/defaultdb?sslmode=disable")
+    
+    db_manager = CockroachDBManager(dsn)
+    try:
+        if archive_older_than is not None:
+            archived = db_manager.archive_transactions(timedelta(days=archive_older_than))
+            print(f"🗄️  Archived {archived:,} transactions older than {archive_older_than} days")
+        if ttl_days == 0:
+            db_manager.disable_transaction_ttl()
+        elif ttl_days is not None:
+            db_manager.enable_transaction_ttl(timedelta(days=ttl_days))
+    finally:
+        db_manager.close_all_connections()
+
+
 def cleanup_enhanced_schema():
     """Cleanup function to drop all enhanced schema objects."""
     dsn = os.environ.get("DATABASE_URL", "postgresql://root@localhost:26257/defaultdb?sslmode=disable")
@@ -432,6 +2062,7 @@ def cleanup_enhanced_schema():
     print("⚠️  This will permanently delete the following objects:")
     print("   • accounts table (and all data)")
     print("   • transactions table (and all data)")
+    print("   • transactions_archive table (and all data)")
     print("   • account_summaries materialized view")
     print("   • update_account_timestamp function")
     print("   • account_update_trigger trigger")
@@ -473,6 +2104,42 @@ Usage Examples:
   # Run with verbose logging
   python enhanced_example.py --verbose --demo
 
+  # Log the statements of transactions slower than 50ms
+  python enhanced_example.py --demo --slow-txn-ms 50
+
+  # Compare tail latency of rollback vs. savepoint retries on hot accounts
+  python enhanced_example.py --benchmark-contention --bench-threads 32
+
+  # Capture EXPLAIN ANALYZE plans of the hot queries and suggest indexes
+  python enhanced_example.py --diagnose
+
+  # Create the suggested indexes and compare timings before and after
+  python enhanced_example.py --diagnose --apply-suggestions
+
+  # Maintain updated_at with ON UPDATE NOW() instead of a trigger
+  python enhanced_example.py --demo --updated-at-mode on-update
+
+  # Use bit-reversed INT8 keys instead of random UUIDs (run --cleanup first to switch)
+  python enhanced_example.py --demo --key-scheme bit-reversed
+
+  # Serve account reads from a changefeed-fed cache of up to 1000 rows
+  python enhanced_example.py --demo --account-cache 1000
+
+  # Compare transfer throughput with and without the updated_at trigger
+  python enhanced_example.py --benchmark-updated-at
+
+  # Move transactions older than 90 days into transactions_archive
+  python enhanced_example.py --archive-older-than 90
+
+  # Or let row-level TTL delete them
+  python enhanced_example.py --ttl-days 90
+
+  # Measure ingest and query latency as history grows, then after archiving
+  python enhanced_example.py --benchmark-retention
+
+  # Run the analytics queries in parallel over the connection pool
+  python enhanced_example.py --demo --concurrent-analytics
+
   # Cleanup all demo tables and views
   python enhanced_example.py --cleanup
 
@@ -484,6 +2151,40 @@ Usage Examples:
     
     parser.add_argument("-v", "--verbose", action="store_true", help="Enable debug logging")
     parser.add_argument("--demo", action="store_true", help="Run advanced features demonstration")
+    parser.add_argument("--concurrent-analytics", action="store_true",
+                       help="Run the analytics queries in parallel (with --demo)")
+    parser.add_argument("--slow-txn-ms", type=float,
+                       help="Log statements of transactions slower than this (with --demo)")
+    parser.add_argument("--retry-mode", choices=RETRY_MODES, default='rollback',
+                       help="How transactions are retried on serialization failures (with --demo)")
+    parser.add_argument("--updated-at-mode", choices=UPDATED_AT_MODES, default='trigger',
+                       help="How accounts.updated_at is maintained (with --demo)")
+    parser.add_argument("--key-scheme", choices=KEY_SCHEMES, default='uuid',
+                       help="How account and transaction ids are generated (with --demo)")
+    parser.add_argument("--account-cache", type=int, metavar="ROWS",
+                       help="Cache up to ROWS accounts, kept fresh by a changefeed (with --demo)")
+    parser.add_argument("--benchmark-updated-at", action="store_true",
+                       help="Benchmark transfers with the updated_at trigger vs. ON UPDATE NOW()")
+    parser.add_argument("--archive-older-than", type=int, metavar="DAYS",
+                       help="Move transactions older than DAYS into transactions_archive")
+    parser.add_argument("--ttl-days", type=int, metavar="DAYS",
+                       help="Enable row-level TTL deleting transactions older than DAYS (0 disables it)")
+    parser.add_argument("--benchmark-retention", action="store_true",
+                       help="Benchmark ingest and query latency as history grows and after archiving")
+    parser.add_argument("--benchmark-contention", action="store_true",
+                       help="Benchmark transfer latency on hot accounts for each retry mode")
+    parser.add_argument("--force", action="store_true",
+                       help="Let benchmarks drop existing demo tables (use a scratch database instead)")
+    parser.add_argument("--bench-threads", type=int, default=16,
+                       help="Concurrent callers for benchmarks")
+    parser.add_argument("--bench-ops", type=int, default=50,
+                       help="Operations per benchmark caller")
+    parser.add_argument("--diagnose", action="store_true",
+                       help="Capture EXPLAIN ANALYZE plans and statistics for the hot queries")
+    parser.add_argument("--apply-suggestions", action="store_true",
+                       help="Create the suggested indexes and re-measure (with --diagnose)")
+    parser.add_argument("--diagnostics-output", default="query_diagnostics.json",
+                       help="File to write plans and statistics to (with --diagnose)")
     parser.add_argument("--cleanup", action="store_true", help="Drop all tables and views created by --demo")
     parser.add_argument("dsn", nargs="?", default=os.environ.get("DATABASE_URL"),
                        help="Database connection string")
@@ -498,12 +2199,27 @@ Usage Examples:
         format='%(asctime)s - %(levelname)s - %(message)s'
     )
     
-    if args.cleanup:
+    if args.diagnose:
+        diagnose_queries(args.apply_suggestions, args.diagnostics_output)
+    elif args.benchmark_contention:
+        benchmark_retry_modes(args.bench_threads, args.bench_ops, force=args.force)
+    elif args.benchmark_updated_at:
+        benchmark_updated_at_modes(args.bench_threads, args.bench_ops, force=args.force)
+    elif args.benchmark_retention:
+        benchmark_retention(force=args.force)
+    elif args.archive_older_than is not None or args.ttl_days is not None:
+        manage_retention(args.archive_older_than, args.ttl_days)
+    elif args.cleanup:
         # Run cleanup to drop all enhanced schema objects
         cleanup_enhanced_schema()
     elif args.demo:
         # Run the demonstration of enhanced CockroachDB features
-        demonstrate_advanced_features()
+        demonstrate_advanced_features(concurrent_analytics=args.concurrent_analytics,
+                                      slow_transaction_ms=args.slow_txn_ms,
+                                      retry_mode=args.retry_mode,
+                                      updated_at_mode=args.updated_at_mode,
+                                      key_scheme=args.key_scheme,
+                                      account_cache_size=args.account_cache)
     else:
         # Run original simple example
         print("Run with --demo flag to see enhanced features")
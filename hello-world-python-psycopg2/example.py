@@ -79,22 +79,33 @@ def transfer_funds(conn, frm, to, amount):
     logging.debug("transfer_funds(): status message: %s", cur.statusmessage)
 
 
-def run_transaction(conn, op, max_retries=3):
+def run_transaction(conn, op, max_retries=3, instrumentation=None, name="transaction"):
     """
     Execute the operation *op(conn)* retrying serialization failure.
 
     If the database returns an error asking to retry the transaction, retry it
     *max_retries* times before giving up (and propagate it).
+
+    *instrumentation*, if given, receives the same on_attempt/on_retry/
+    on_commit/on_failure calls as CockroachDBManager.run_transaction in
+    enhanced_example.py, so enhanced_example.TransactionStats can be used here.
     """
+    start = time.perf_counter()
     # leaving this block the transaction will commit or rollback
     # (if leaving with an exception)
     with conn:
         for retry in range(1, max_retries + 1):
+            attempt_start = time.perf_counter()
+            if instrumentation:
+                instrumentation.on_attempt(name, retry)
             try:
                 op(conn)
 
                 # If we reach this point, we were able to commit, so we break
                 # from the retry loop.
+                if instrumentation:
+                    now = time.perf_counter()
+                    instrumentation.on_commit(name, retry, now - start, now - attempt_start)
                 return
 
             except SerializationFailure as e:
@@ -106,13 +117,29 @@ def run_transaction(conn, op, max_retries=3):
                 logging.debug("EXECUTE SERIALIZATION_FAILURE BRANCH")
                 sleep_ms = (2**retry) * 0.1 * (random.random() + 0.5)
                 logging.debug("Sleeping %s seconds", sleep_ms)
+                if instrumentation:
+                    instrumentation.on_retry(name, retry, e.pgcode, sleep_ms)
                 time.sleep(sleep_ms)
 
             except psycopg2.Error as e:
                 logging.debug("got error: %s", e)
                 logging.debug("EXECUTE NON-SERIALIZATION_FAILURE BRANCH")
+                if instrumentation:
+                    instrumentation.on_failure(
+                        name, retry, time.perf_counter() - start, e.pgcode)
                 raise e
 
+            except Exception:
+                # Application errors, e.g. insufficient funds, end the
+                # transaction too and count as failures
+                if instrumentation:
+                    instrumentation.on_failure(
+                        name, retry, time.perf_counter() - start, None)
+                raise
+
+        if instrumentation:
+            instrumentation.on_failure(
+                name, max_retries, time.perf_counter() - start, "40001")
         raise ValueError(
             f"transaction did not succeed after {max_retries} retries")
 
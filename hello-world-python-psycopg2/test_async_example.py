@@ -0,0 +1,64 @@
+"""Unit tests for async_example that need no running cluster."""
+
+import asyncio
+from contextlib import asynccontextmanager
+from decimal import Decimal
+
+from psycopg import sql
+
+from async_example import AsyncCockroachDBManager
+
+
+class RecordingConnection:
+    """Async connection that logs every statement and answers with a fixed snapshot row."""
+
+    def __init__(self):
+        self.statements = []
+
+    @asynccontextmanager
+    async def cursor(self):
+        yield RecordingCursor(self)
+
+    async def rollback(self):
+        self.statements.append('ROLLBACK')
+
+
+class RecordingCursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    async def execute(self, query, params=None):
+        if isinstance(query, sql.Composable):
+            query = query.as_string(None)
+        self.connection.statements.append(' '.join(query.split()))
+
+    async def fetchone(self):
+        return {'snapshot': Decimal('1700000000000000000.0000000001')}
+
+    async def fetchall(self):
+        return []
+
+
+class RecordingPool:
+    def __init__(self):
+        self.connections = []
+
+    @asynccontextmanager
+    async def connection(self):
+        conn = RecordingConnection()
+        self.connections.append(conn)
+        yield conn
+
+
+def test_analytics_queries_share_one_snapshot():
+    manager = AsyncCockroachDBManager.__new__(AsyncCockroachDBManager)
+    manager.connection_pool = RecordingPool()
+
+    asyncio.run(manager.get_account_analytics())
+
+    snapshot, *queries = manager.connection_pool.connections
+    assert snapshot.statements[0] == "SELECT cluster_logical_timestamp() AS snapshot"
+    assert len(queries) == 4
+    for conn in queries:
+        assert conn.statements[0] == "SET TRANSACTION AS OF SYSTEM TIME '1700000000000000000.0000000001'"
+        assert conn.statements[-1] == 'ROLLBACK'
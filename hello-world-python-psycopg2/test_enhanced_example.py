@@ -0,0 +1,408 @@
+"""Unit tests for enhanced_example that need no running cluster."""
+
+import json
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from contextlib import contextmanager
+
+import psycopg2
+import pytest
+from psycopg2.errors import SerializationFailure, StatementCompletionUnknown
+
+from enhanced_example import (
+    DIAGNOSTIC_QUERIES,
+    AccountCache,
+    AmbiguousCommitError,
+    CockroachDBManager,
+    TransactionStats,
+    _ChangefeedStream,
+)
+
+
+def hlc(offset: float = 0.0) -> str:
+    """HLC timestamp string *offset* seconds from now."""
+    return f"{int((time.time() + offset) * 1e9)}.0000000000"
+
+
+def changefeed_line(key, value) -> str:
+    """One changefeed row in COPY text format."""
+    escape = lambda text: text.replace('\\', '\\\\').replace('\t', '\\t')
+    fields = ['\\N' if key is None else 'accounts',
+              '\\N' if key is None else escape(json.dumps(key)),
+              escape(json.dumps(value))]
+    return '\t'.join(fields) + '\n'
+
+
+def feed(cache: AccountCache, *lines: str):
+    stream = _ChangefeedStream(cache._apply)
+    for line in lines:
+        stream.write(line.encode())
+
+
+def test_hash_sharded_key_is_cached_under_account_id():
+    cache = AccountCache('postgresql://unused')
+    updated = hlc(-1)
+    feed(cache,
+         changefeed_line([7, 123456], {'after': {'id': 123456, 'balance': 10.5}, 'updated': updated}),
+         changefeed_line(None, {'resolved': hlc()}))
+
+    assert cache.get(123456, max_staleness=5) == (True, {'id': 123456, 'balance': Decimal('10.5')})
+    assert cache.get(7, max_staleness=5) == (False, None)
+
+
+def test_hash_sharded_delete_uses_last_key_column():
+    cache = AccountCache('postgresql://unused')
+    feed(cache,
+         changefeed_line([7, 123456], {'after': {'id': 123456, 'balance': 10}, 'updated': hlc(-2)}),
+         changefeed_line([7, 123456], {'after': None, 'updated': hlc(-1)}),
+         changefeed_line(None, {'resolved': hlc()}))
+
+    assert cache.get(123456, max_staleness=5) == (True, None)
+
+
+def test_changefeed_updates_rows_admitted_from_database_reads():
+    cache = AccountCache('postgresql://unused')
+    admitted_at = Decimal(hlc(-2))
+    cache.admit(123456, admitted_at, {'id': 123456, 'balance': Decimal('1')}, cache.generation)
+    feed(cache,
+         changefeed_line([3, 123456], {'after': {'id': 123456, 'balance': 2}, 'updated': hlc(-1)}),
+         changefeed_line(None, {'resolved': hlc()}))
+
+    assert cache.get(123456, max_staleness=5) == (True, {'id': 123456, 'balance': 2})
+
+
+def test_own_write_is_not_undone_by_older_changefeed_events():
+    cache = AccountCache('postgresql://unused')
+    before, committed = hlc(-2), hlc(-1)
+    feed(cache, changefeed_line([1], {'after': {'id': 1, 'balance': 100}, 'updated': before}))
+    cache.invalidate([1], Decimal(committed))
+
+    # An event from before the write arrives late, after the invalidation
+    feed(cache,
+         changefeed_line([1], {'after': {'id': 1, 'balance': 100}, 'updated': before}),
+         changefeed_line(None, {'resolved': hlc()}))
+    assert cache.get(1, max_staleness=5) == (False, None)
+
+    # The write itself carries the commit timestamp and replaces the marker
+    feed(cache, changefeed_line([1], {'after': {'id': 1, 'balance': 75}, 'updated': committed}))
+    assert cache.get(1, max_staleness=5) == (True, {'id': 1, 'balance': 75})
+
+
+def test_database_read_after_an_invalidation_replaces_the_marker():
+    cache = AccountCache('postgresql://unused')
+    feed(cache, changefeed_line(None, {'resolved': hlc()}))
+    version, marked = Decimal(hlc(-2)), Decimal(hlc(-1))
+    cache.invalidate([5], marked)
+
+    # A read from before the marker may predate the change it stands for
+    cache.admit(5, version, {'id': 5, 'balance': 1}, cache.generation, read_timestamp=version)
+    assert cache.get(5, max_staleness=5) == (False, None)
+
+    # Nothing newer was written, so a later read of the older version is current
+    cache.admit(5, version, {'id': 5, 'balance': 1}, cache.generation, read_timestamp=marked)
+    assert cache.get(5, max_staleness=5) == (True, {'id': 5, 'balance': 1})
+
+
+class FakeConnection:
+    """Connection whose cursors return *rows* to every query and record nothing."""
+
+    encoding = 'UTF8'
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    @contextmanager
+    def cursor(self):
+        yield FakeCursor(self)
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def execute(self, sql, params=None):
+        pass
+
+    def mogrify(self, template, args):
+        return b"()"
+
+    def fetchall(self):
+        return self.connection.rows
+
+
+def test_batch_transfer_reports_committed_chunks_when_a_later_chunk_fails():
+    manager = CockroachDBManager.__new__(CockroachDBManager)
+    manager.account_cache = None
+    manager.key_type = 'INT8'
+    manager.get_connection = contextmanager(lambda: (yield None))
+    chunks = []
+
+    def run_transaction(conn, operation):
+        chunks.append(operation)
+        if len(chunks) == 2:
+            raise psycopg2.OperationalError("node unavailable")
+        operation(FakeConnection([{'id': 1, 'balance': Decimal('100'), 'is_active': True},
+                                  {'id': 2, 'balance': Decimal('100'), 'is_active': True}]))
+
+    manager.run_transaction = run_transaction
+    results = manager.batch_transfer([(1, 2, Decimal('1'))] * 5, batch_size=2)
+
+    assert len(chunks) == 3
+    assert [result['index'] for result in results] == [0, 1, 2, 3, 4]
+    assert [result['status'] for result in results] == ['completed', 'completed', 'failed', 'failed', 'completed']
+    assert results[2]['error'] == "node unavailable"
+
+
+class RecordingConnection:
+    """Connection that logs every statement and answers with a fixed snapshot row."""
+
+    def __init__(self):
+        self.statements = []
+
+    @contextmanager
+    def cursor(self):
+        yield RecordingCursor(self)
+
+    def rollback(self):
+        self.statements.append('ROLLBACK')
+
+
+class RecordingCursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def execute(self, sql, params=None):
+        self.connection.statements.append((' '.join(sql.split()), params))
+
+    def fetchone(self):
+        return {'snapshot': Decimal('1700000000000000000.0000000001')}
+
+    def fetchall(self):
+        return []
+
+
+class RecordingPool:
+    def __init__(self, size):
+        self.free = [RecordingConnection() for _ in range(size)]
+        self.connections = list(self.free)
+
+    def getconn(self, timeout=None):
+        if not self.free:
+            raise psycopg2.pool.PoolError("exhausted")
+        return self.free.pop()
+
+    def putconn(self, conn):
+        self.free.append(conn)
+
+
+def test_concurrent_analytics_share_one_snapshot():
+    manager = CockroachDBManager.__new__(CockroachDBManager)
+    manager.connection_pool = RecordingPool(2)
+
+    manager.get_account_analytics(concurrent=True)
+
+    as_of = ("SET TRANSACTION AS OF SYSTEM TIME %s", ('1700000000000000000.0000000001',))
+    for conn in manager.connection_pool.connections:
+        # Each connection pins the snapshot before its share of the four queries
+        statements = [statement for statement in conn.statements
+                      if statement != 'ROLLBACK' and 'cluster_logical_timestamp' not in statement[0]]
+        assert statements[0] == as_of
+        assert len(statements) == 3
+
+
+def test_suggested_time_ordered_indexes_are_hash_sharded():
+    for query in DIAGNOSTIC_QUERIES.values():
+        for index in query['indexes']:
+            if 'transactions (created_at)' in index:
+                assert 'USING HASH' in index
+
+
+def test_ttl_expiration_expression_is_immutable():
+    manager = CockroachDBManager.__new__(CockroachDBManager)
+    conn = RecordingConnection()
+    conn.commit = lambda: None
+    manager.get_connection = contextmanager(lambda: (yield conn))
+
+    manager.enable_transaction_ttl(timedelta(days=30))
+
+    sql, params = conn.statements[0]
+    assert 'ttl_expiration_expression = %s' in sql
+    assert params[0] == ("((created_at AT TIME ZONE 'UTC') + INTERVAL '2592000 seconds') "
+                         "AT TIME ZONE 'UTC'")
+
+
+class ReadBackConnection:
+    """Connection for a batch transfer that answers the cache read-back with account rows."""
+
+    encoding = 'UTF8'
+
+    def __init__(self, accounts):
+        self.accounts = accounts
+        self.read_back = None
+
+    @contextmanager
+    def cursor(self):
+        yield ReadBackCursor(self)
+
+    def rollback(self):
+        pass
+
+
+class ReadBackCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.rows = []
+
+    def execute(self, sql, params=None):
+        if isinstance(sql, str) and 'crdb_internal_mvcc_timestamp' in sql:
+            self.connection.read_back = params[0]
+            self.rows = [dict(self.connection.accounts[account_id], mvcc_timestamp=Decimal(hlc(-1)),
+                              read_timestamp=Decimal(hlc(-0.5)))
+                         for account_id in params[0]]
+        else:
+            self.rows = list(self.connection.accounts.values())
+
+    def mogrify(self, template, args):
+        return b"()"
+
+    def fetchall(self):
+        return self.rows
+
+
+def test_batch_transfer_reads_back_only_updated_accounts():
+    manager = CockroachDBManager.__new__(CockroachDBManager)
+    manager.key_type = 'INT8'
+    manager.account_cache = AccountCache('postgresql://unused')
+    feed(manager.account_cache, changefeed_line(None, {'resolved': hlc()}))
+    conn = ReadBackConnection({account_id: {'id': account_id, 'balance': Decimal('10'), 'is_active': True}
+                               for account_id in (1, 2, 3, 4)})
+    manager.get_connection = contextmanager(lambda: (yield conn))
+    manager.run_transaction = lambda conn, operation: operation(conn)
+
+    results = manager.batch_transfer([(1, 2, Decimal('5')), (3, 4, Decimal('50'))])
+
+    assert [result['status'] for result in results] == ['completed', 'failed']
+    # Accounts 3 and 4 were not written, so they are neither read back nor left pending
+    assert conn.read_back == [1, 2]
+    assert manager.account_cache.get(1, max_staleness=5)[0]
+    assert manager.account_cache.get(3, max_staleness=5) == (False, None)
+
+
+class SavepointConnection:
+    """Connection that logs the retry protocol and raises scripted errors.
+
+    *failures* maps a statement, or ``'COMMIT'``, to the errors its next
+    executions raise, one per execution.
+    """
+
+    closed = False
+
+    def __init__(self, failures=None):
+        self.failures = failures or {}
+        self.statements = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # Like psycopg2, leaving the block commits, or rolls back after an error
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+
+    @contextmanager
+    def cursor(self):
+        yield SavepointCursor(self)
+
+    def run(self, statement):
+        self.statements.append(statement)
+        errors = self.failures.get(statement)
+        if errors:
+            raise errors.pop(0)
+
+    def commit(self):
+        self.run('COMMIT')
+
+    def rollback(self):
+        self.statements.append('ROLLBACK')
+
+
+class SavepointCursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def execute(self, sql, params=None):
+        self.connection.run(sql)
+
+
+def savepoint_manager(retry_mode='savepoint'):
+    manager = CockroachDBManager.__new__(CockroachDBManager)
+    manager.instrumentation = TransactionStats()
+    manager.retry_mode = retry_mode
+    manager.max_retries = 3
+    manager.retry_backoff_base = 0.0
+    manager.retry_backoff_cap = 0.0
+    return manager
+
+
+def transfer(conn):
+    with conn.cursor() as cur:
+        cur.execute("UPDATE accounts")
+
+
+def test_savepoint_retry_rolls_back_to_the_savepoint():
+    manager = savepoint_manager()
+    conn = SavepointConnection({'UPDATE accounts': [SerializationFailure("restart transaction")]})
+
+    manager.run_transaction(conn, transfer)
+
+    # The retry stays inside the transaction instead of beginning a new one
+    assert conn.statements == ['SAVEPOINT cockroach_restart', 'UPDATE accounts',
+                               'ROLLBACK TO SAVEPOINT cockroach_restart', 'UPDATE accounts',
+                               'RELEASE SAVEPOINT cockroach_restart', 'COMMIT']
+    stats = manager.get_transaction_stats()['transfer']
+    assert (stats['committed'], stats['retries']) == (1, 1)
+
+
+def test_savepoint_ambiguous_commit_is_reported():
+    manager = savepoint_manager()
+    conn = SavepointConnection({'COMMIT': [StatementCompletionUnknown("result is ambiguous")]})
+
+    with pytest.raises(AmbiguousCommitError):
+        manager.run_transaction(conn, transfer)
+
+    assert conn.statements[-2:] == ['COMMIT', 'ROLLBACK']
+    assert conn.statements.count('UPDATE accounts') == 1
+    assert manager.get_transaction_stats()['transfer']['failed'] == 1
+
+
+def test_savepoint_ambiguous_commit_reruns_idempotent_operations():
+    manager = savepoint_manager()
+    conn = SavepointConnection({'COMMIT': [StatementCompletionUnknown("result is ambiguous")]})
+
+    manager.run_transaction(conn, transfer, idempotent=True)
+
+    # A fresh transaction, with its own savepoint, runs the operation again
+    assert conn.statements == ['SAVEPOINT cockroach_restart', 'UPDATE accounts',
+                               'RELEASE SAVEPOINT cockroach_restart', 'COMMIT', 'ROLLBACK',
+                               'SAVEPOINT cockroach_restart', 'UPDATE accounts',
+                               'RELEASE SAVEPOINT cockroach_restart', 'COMMIT']
+    stats = manager.get_transaction_stats()['transfer']
+    assert (stats['committed'], stats['retries']) == (1, 1)
+
+
+def test_retry_modes_share_the_backoff_policy(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr('enhanced_example.time.sleep', sleeps.append)
+    for retry_mode in ('rollback', 'savepoint'):
+        manager = savepoint_manager(retry_mode)
+        manager.max_retries = 12
+        manager.retry_backoff_base, manager.retry_backoff_cap = 0.05, 2.0
+        conn = SavepointConnection({'UPDATE accounts': [SerializationFailure("restart transaction")] * 11})
+        manager.run_transaction(conn, transfer)
+
+    assert len(sleeps) == 22
+    assert max(sleeps) <= 2.0
@@ -0,0 +1,28 @@
+"""Unit tests for example that need no running cluster."""
+
+import pytest
+
+from enhanced_example import TransactionStats
+from example import run_transaction
+
+
+class FakeConnection:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+def test_application_errors_are_recorded_as_failures():
+    stats = TransactionStats()
+
+    def transfer(conn):
+        raise RuntimeError("insufficient funds")
+
+    with pytest.raises(RuntimeError):
+        run_transaction(FakeConnection(), transfer, instrumentation=stats, name="transfer")
+
+    snapshot = stats.snapshot()['transfer']
+    assert (snapshot['transactions'], snapshot['failed']) == (1, 1)
+    assert snapshot['failure_reasons'] == {'unknown': 1}